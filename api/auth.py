@@ -8,9 +8,13 @@ from core.security import create_access_token, get_current_user
 router = APIRouter(prefix="/auth", tags=["authentication"])
 db = DatabaseManager()
 
+# Note: create_user/verify_user run their PBKDF2 hashing inside
+# DatabaseManager's worker-thread wrappers, so the ~100ms KDF never
+# pins the event loop and logins can proceed concurrently.
+
 @router.post("/register", response_model=dict)
 async def register_user(user: UserCreate):
-    if not db.create_user(user.username, user.password):
+    if not await db.create_user(user.username, user.password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already exists"
@@ -19,7 +23,7 @@ async def register_user(user: UserCreate):
 
 @router.post("/token", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    if not db.verify_user(form_data.username, form_data.password):
+    if not await db.verify_user(form_data.username, form_data.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -1,13 +1,15 @@
 # api/chat.py
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from fastapi.responses import StreamingResponse
-import httpx
-import json
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
+from fastapi.responses import Response, StreamingResponse
+import asyncio
+import hashlib
+import orjson
 from typing import Dict
 from database.models import ChatRename, ChatRequest, ChatBase
 from database.manager import DatabaseManager
 from core.security import get_current_user
 from core.config import settings
+from core.http import ollama_client
 from context.manager import ContextManager
 from context.reasoning import Reasoning
 import logging
@@ -18,52 +20,108 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/chat", tags=["chat"])
 db = DatabaseManager()
 
+# Messages per chat window; the stored window grows to twice this before
+# rotating so consecutive prompts share a cacheable prefix.
+CHAT_WINDOW_SIZE = 10
+
+# How many chunks of a long message are reasoned over concurrently.
+CHUNK_CONCURRENCY = 4
+
+# Admission control for Ollama: matches the server's true batch capacity
+# so overload queues here instead of duplicating KV contexts server-side.
+OLLAMA_SEM = asyncio.Semaphore(settings.OLLAMA_MAX_CONCURRENCY)
+
+# Pre-built SSE framing so the per-token hot loop only serializes the
+# payload dict and concatenates bytes.
+_SSE_PREFIX = b"data: "
+_SSE_SUFFIX = b"\n\n"
+
+# Token coalescing for the basic streaming path: adjacent tokens arriving
+# within the flush window are folded into one SSE event, so a fast
+# generation costs one JSON encode and one socket write per ~20ms instead
+# of per token. Imperceptible to the client, much cheaper under load.
+_SSE_FLUSH_INTERVAL = 0.02
+_SSE_FLUSH_BYTES = 1024
+
+def sse_event(payload: dict) -> bytes:
+    return _SSE_PREFIX + orjson.dumps(payload) + _SSE_SUFFIX
+
+# Shared headers for all SSE responses. X-Accel-Buffering stops reverse
+# proxies from buffering the stream, which would wreck time-to-first-token.
+_SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive',
+    'Content-Type': 'text/event-stream',
+    'X-Accel-Buffering': 'no'
+}
+
+def sse(generator) -> StreamingResponse:
+    return StreamingResponse(generator, media_type="text/event-stream", headers=_SSE_HEADERS)
+
 @router.post("/create", response_model=Dict[str, int])
 async def create_chat(
     chat: ChatBase,
     current_user: str = Depends(get_current_user)
 ):
-    chat_id = db.create_chat(current_user, chat.title, chat.model, chat.system_prompt)
+    chat_id = await db.create_chat(current_user, chat.title, chat.model, chat.system_prompt)
     logger.debug(f"Chat created with ID: {chat_id}")
     return {"chat_id": chat_id}
 
 @router.get("/list")
 async def get_chats(current_user: str = Depends(get_current_user)):
-    return {"chats": db.get_user_chats(current_user)}
+    return {"chats": await db.get_user_chats(current_user)}
 
 @router.get("/{chat_id}/details")
 async def get_chat_details(
     chat_id: int,
     current_user: str = Depends(get_current_user)
 ):
-    if not db.verify_chat_ownership(chat_id, current_user):
+    # Ownership and details in one query; None covers both a missing
+    # chat and someone else's, matching what the two-step check reported.
+    details = await db.get_chat_details_for_user(chat_id, current_user)
+    if details is None:
         raise HTTPException(status_code=403, detail="Not authorized to access this chat")
-    details = db.get_chat_details(chat_id)
-    if details:
-        return details
-    raise HTTPException(status_code=404, detail="Chat not found")
+    return details
 
 @router.get("/{chat_id}/messages")
 async def get_chat_messages(
     chat_id: int,
+    request: Request,
     current_user: str = Depends(get_current_user)
 ):
-    if not db.verify_chat_ownership(chat_id, current_user):
+    if not await db.verify_chat_ownership(chat_id, current_user):
         raise HTTPException(status_code=403, detail="Not authorized to access this chat")
-    return {"messages": db.get_chat_messages(chat_id)}
+    messages = await db.get_chat_messages(chat_id)
+    # Hash the serialized body rather than count + newest timestamp:
+    # regeneration rewrites a message in place without changing either,
+    # which would leave a metadata-based tag stale. A matching
+    # If-None-Match turns the repeat navigation into a body-less 304
+    # instead of re-shipping the whole history.
+    body = orjson.dumps({"messages": messages})
+    etag = f'W/"{hashlib.md5(body).hexdigest()[:16]}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304)
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "private, max-age=0, must-revalidate"},
+    )
 
 @router.delete("/{chat_id}")
 async def delete_chat(
     chat_id: int,
     current_user: str = Depends(get_current_user)
 ):
-    if not db.verify_chat_ownership(chat_id, current_user):
+    if not await db.verify_chat_ownership(chat_id, current_user):
         raise HTTPException(status_code=403, detail="Not authorized to access this chat")
-    db.delete_chat(chat_id)
+    await db.delete_chat(chat_id)
     
-    # Use the default model from config when deleting context.
-    context_manager = ContextManager(chat_id=chat_id, model=settings.DEFAULT_MODEL)
-    context_manager.delete_context()
+    # Use the default model from config when deleting context. Both the
+    # constructor (memory + index load) and the delete touch disk, so
+    # they run off the event loop.
+    def _drop_context():
+        ContextManager(chat_id=chat_id, model=settings.DEFAULT_MODEL).delete_context()
+    await asyncio.to_thread(_drop_context)
     
     return {"message": "Chat and its context deleted successfully"}
 
@@ -73,36 +131,35 @@ async def regenerate_message(
     message_index: int,
     current_user: str = Depends(get_current_user)
 ):
-    if not db.verify_chat_ownership(chat_id, current_user):
+    chat_details, messages, _ = await db.get_chat_bundle(
+        chat_id, current_user, include_preferences=False
+    )
+    if chat_details is None:
         raise HTTPException(status_code=403, detail="Not authorized to access this chat")
 
-    messages = db.get_chat_messages(chat_id)
-    new_context = []
-    
-    for i, msg in enumerate(messages):
-        if i < message_index:
-            new_context.append(msg)
-        elif i == message_index - 1 and msg['role'] == 'user':
-            new_context.append(msg)
-            
-    chat_details = db.get_chat_details(chat_id)
-    if not chat_details:
-        raise HTTPException(status_code=404, detail="Chat not found")
-    
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{settings.OLLAMA_API_URL}/api/chat",
+    # Everything before message_index is the regeneration context; the old
+    # elif branch here was dead (i == message_index - 1 is already covered
+    # by i < message_index). Trim trailing assistant turns so the context
+    # always ends on the user message being answered.
+    new_context = messages[:message_index]
+    while new_context and new_context[-1]['role'] != 'user':
+        new_context.pop()
+
+    async with OLLAMA_SEM:
+        response = await ollama_client.post(
+            "/api/chat",
             json={
                 "model": chat_details['model'],
                 "messages": new_context,
                 "stream": False
             }
         )
-        
+
+
     if response.status_code == 200:
         data = response.json()
         new_response = data.get('message', {}).get('content', "")
-        db.update_message(chat_id, message_index, new_response)
+        await db.update_message(chat_id, message_index, new_response)
         logger.debug(f"Message regenerated for chat {chat_id} at index {message_index}")
         return {
             "message": "Message regenerated successfully",
@@ -118,10 +175,10 @@ async def rename_chat_endpoint(
     rename: ChatRename,
     current_user: str = Depends(get_current_user)
 ):
-    if not db.verify_chat_ownership(chat_id, current_user):
+    if not await db.verify_chat_ownership(chat_id, current_user):
         raise HTTPException(status_code=403, detail="Not authorized to rename this chat")
     
-    success = db.rename_chat(chat_id, rename.title)
+    success = await db.rename_chat(chat_id, rename.title)
     if success:
         logger.debug(f"Chat {chat_id} renamed to {rename.title}")
         return {"message": "Chat renamed successfully"}
@@ -136,20 +193,39 @@ async def send_message(
     current_user: str = Depends(get_current_user)
 ):
     if not request.chat_id:
-        request.chat_id = db.create_chat(current_user, "", request.model)
-    
-    if not db.verify_chat_ownership(request.chat_id, current_user):
+        # New chat: create it and persist the user message in one
+        # transaction instead of two separate commits.
+        request.chat_id = await db.create_chat_with_message(
+            current_user, "", request.model, None, "user", request.message
+        )
+        user_message_saved = True
+    else:
+        user_message_saved = False
+
+    chat_details, existing_messages, preferences = await db.get_chat_bundle(
+        request.chat_id, current_user, window_size=CHAT_WINDOW_SIZE
+    )
+    if chat_details is None:
         raise HTTPException(status_code=403, detail="Not authorized to access this chat")
-    
-    chat_details = db.get_chat_details(request.chat_id)
-    if not chat_details:
-        raise HTTPException(status_code=404, detail="Chat not found")
-    
-    context_manager = ContextManager(chat_id=request.chat_id, model=request.model)
-    existing_messages = db.get_chat_messages(request.chat_id)
+    if user_message_saved:
+        # The just-created chat's only row is the user message; drop it
+        # from history so prompt construction below stays identical.
+        existing_messages = existing_messages[:-1]
+
+    # The constructor reads the chat's memory file and ANN index from
+    # disk, so it runs in a worker thread like the DB calls around it.
+    context_manager = await asyncio.to_thread(
+        ContextManager, chat_id=request.chat_id, model=request.model
+    )
     system_prompt = chat_details.get('system_prompt')
     
-    optimized_messages = context_manager.optimize_messages(existing_messages, system_prompt)
+    # optimize_messages can run a full summarization through the sync
+    # client once the history outgrows the context window, so it goes
+    # through a worker thread — inline it would stall every in-flight
+    # stream for the length of an LLM generation.
+    optimized_messages = await asyncio.to_thread(
+        context_manager.optimize_messages, existing_messages, system_prompt
+    )
     
     user_message = request.message
     user_message_tokens = context_manager._estimate_tokens([{"role": "user", "content": user_message}])
@@ -158,59 +234,112 @@ async def send_message(
     logger.debug(f"Optimized context for chat {request.chat_id}:\n{context_str[:200]}...")
     
     # Get user preferences, defaulting to True if not specified
-    _, _, _, use_reasoning = db.get_user_preferences(current_user)
+    _, _, _, use_reasoning = preferences
     use_reasoning = use_reasoning if use_reasoning is not None else True
     
-    # Save user message immediately
-    db.save_message(request.chat_id, "user", user_message)
+    # Hand the user message to the background writer (unless it was
+    # already written as part of the chat-creation transaction above);
+    # the write queue is FIFO, so it always lands before the assistant
+    # reply enqueued at stream end.
+    if not user_message_saved:
+        await db.enqueue_message(request.chat_id, "user", user_message)
     
     if not use_reasoning:
         # Direct chat without reasoning
         async def generate_basic():
-            full_response = ""
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{settings.OLLAMA_API_URL}/api/chat",
-                    json={
-                        "model": chat_details['model'],
-                        "messages": optimized_messages + [{"role": "user", "content": user_message}],
-                        "stream": True
-                    }
-                )
-                
-                async for line in response.aiter_lines():
-                    if not line:
-                        continue  # skip empty lines
-                    # Remove any "data: " prefix if present.
-                    if line.startswith("data: "):
-                        line = line[6:]
+            full_parts = []
+            buf = []
+            buf_len = 0
+            loop = asyncio.get_running_loop()
+            last_flush = loop.time()
+
+            def flush_event() -> bytes:
+                nonlocal buf, buf_len, last_flush
+                event = sse_event({'type': 'intermediate', 'content': "".join(buf)})
+                buf = []
+                buf_len = 0
+                last_flush = loop.time()
+                return event
+
+            async with OLLAMA_SEM, ollama_client.stream(
+                "POST",
+                "/api/chat",
+                json={
+                    "model": chat_details['model'],
+                    "messages": optimized_messages + [{"role": "user", "content": user_message}],
+                    "stream": True
+                }
+            ) as response:
+                # Ollama emits newline-delimited JSON, not SSE, so each
+                # non-empty line is a complete JSON object. The reader
+                # splits raw bytes on b'\n' itself — no unicode decode for
+                # framing, and orjson parses the bytes directly — and
+                # feeds a queue so the consumer can time out and flush the
+                # buffer when generation pauses mid-window. The queue is
+                # bounded so a slow SSE client backpressures the reader
+                # instead of letting it buffer the whole generation.
+                lines: asyncio.Queue = asyncio.Queue(maxsize=256)
+
+                async def read_lines():
                     try:
-                        data = json.loads(line)
+                        pending = b""
+                        async for chunk in response.aiter_bytes():
+                            pending += chunk
+                            while (nl := pending.find(b"\n")) != -1:
+                                line = pending[:nl].rstrip(b"\r")
+                                pending = pending[nl + 1:]
+                                if line:
+                                    await lines.put(line)
+                        if pending:
+                            await lines.put(pending)
+                    finally:
+                        await lines.put(None)
+
+                reader = asyncio.create_task(read_lines())
+                try:
+                    while True:
+                        try:
+                            line = await asyncio.wait_for(lines.get(), timeout=_SSE_FLUSH_INTERVAL)
+                        except asyncio.TimeoutError:
+                            if buf:
+                                yield flush_event()
+                            continue
+                        if line is None:
+                            # Surface any mid-stream error: otherwise a
+                            # dropped connection reads as a normal end of
+                            # stream and the truncated text would be saved
+                            # as the assistant message below.
+                            await reader
+                            break
+                        if not line:
+                            continue  # skip empty lines
+                        try:
+                            data = orjson.loads(line)
+                        except orjson.JSONDecodeError:
+                            logger.error(f"Error parsing JSON from response: {line}")
+                            continue
                         content = data.get("message", {}).get("content", "")
                         if content:
-                            full_response += content
-                            # Yield intermediate chunks so the client can display partial output.
-                            yield f"data: {json.dumps({'type': 'intermediate', 'content': content})}\n\n"
-                    except json.JSONDecodeError:
-                        logger.error(f"Error parsing JSON from response: {line}")
-                        continue
-            
+                            full_parts.append(content)
+                            buf.append(content)
+                            buf_len += len(content)
+                            if buf_len >= _SSE_FLUSH_BYTES or loop.time() - last_flush >= _SSE_FLUSH_INTERVAL:
+                                yield flush_event()
+                finally:
+                    reader.cancel()
+
+            if buf:
+                yield flush_event()
+
             # After the stream is complete, save the full response to the database.
+            full_response = "".join(full_parts)
             if full_response:
-                db.save_message(request.chat_id, "assistant", full_response)
+                await db.enqueue_message(request.chat_id, "assistant", full_response)
                 background_tasks.add_task(db.update_chat_title, request.chat_id, request.model)
                 # Send one final event indicating completion.
-                yield f"data: {json.dumps({'type': 'final', 'content': full_response})}\n\n"
+                yield sse_event({'type': 'final', 'content': full_response})
         
-        return StreamingResponse(
-            generate_basic(),
-            media_type="text/event-stream",
-            headers={
-                'Cache-Control': 'no-cache',
-                'Connection': 'keep-alive',
-                'Content-Type': 'text/event-stream'
-            }
-        )
+        return sse(generate_basic())
     
     else:
         # Use reasoning pathway
@@ -223,58 +352,84 @@ async def send_message(
                 overlap_tokens = 50
                 chunks = context_manager.chunk_text(user_message, max_chunk_tokens, overlap_tokens)
                 logger.debug(f"User message chunked into {len(chunks)} parts")
-                
-                for i, chunk in enumerate(chunks):
-                    logger.debug(f"Processing chunk {i+1}/{len(chunks)}: {chunk[:100]}...")
-                    chunk_context_messages = context_manager.optimize_messages(
-                        existing_messages + [{"role": "user", "content": chunk}],
-                        system_prompt
-                    )
-                    chunk_context_str = "\n".join(f"{m['role']}: {m['content']}" for m in chunk_context_messages)
-                    reasoning = Reasoning(model_name=request.model, context_str=chunk_context_str)
-                    async for event in reasoning.perform_chain_of_thought_reasoning(chunk):
-                        logger.debug(f"Chunk {i+1}: Received event: {event}")
-                        yield f"data: {json.dumps(event)}\n\n"
-                        if event.get("type") == "final":
-                            full_final += event.get("content", "")
-                
-                await reasoning.close()
-                
+
+                # Chunks are independent, so fan them out concurrently
+                # (bounded by the semaphore) and stream events back to the
+                # client in chunk order via per-chunk queues.
+                sem = asyncio.Semaphore(CHUNK_CONCURRENCY)
+                queues = [asyncio.Queue() for _ in chunks]
+                # ContextManager isn't thread-safe, so the per-chunk
+                # optimize_messages offloads are serialized; the loop
+                # stays free either way.
+                ctx_lock = asyncio.Lock()
+
+                async def process_chunk(i, chunk, queue):
+                    # The sentinel must be enqueued no matter where this
+                    # body fails — prompt building included — or the
+                    # consumer below waits on the queue forever.
+                    try:
+                        async with sem:
+                            logger.debug(f"Processing chunk {i+1}/{len(chunks)}: {chunk[:100]}...")
+                            async with ctx_lock:
+                                chunk_context_messages = await asyncio.to_thread(
+                                    context_manager.optimize_messages,
+                                    existing_messages + [{"role": "user", "content": chunk}],
+                                    system_prompt
+                                )
+                            chunk_context_str = "\n".join(f"{m['role']}: {m['content']}" for m in chunk_context_messages)
+                            reasoning = Reasoning(model_name=request.model, context_str=chunk_context_str)
+                            try:
+                                async with OLLAMA_SEM:
+                                    async for event in reasoning.perform_chain_of_thought_reasoning(chunk):
+                                        await queue.put(event)
+                            finally:
+                                await reasoning.close()
+                    finally:
+                        await queue.put(None)
+
+                tasks = [
+                    asyncio.create_task(process_chunk(i, chunk, queue))
+                    for i, (chunk, queue) in enumerate(zip(chunks, queues))
+                ]
+                try:
+                    for i, (queue, task) in enumerate(zip(queues, tasks)):
+                        while (event := await queue.get()) is not None:
+                            logger.debug(f"Chunk {i+1}: Received event: {event}")
+                            yield sse_event(event)
+                            if event.get("type") == "final":
+                                full_final += event.get("content", "")
+                        # The sentinel also fires on failure; await the
+                        # task so its exception is observed and reported
+                        # instead of the chunk silently vanishing.
+                        try:
+                            await task
+                        except Exception:
+                            logger.exception(f"Chunk {i+1} failed during reasoning")
+                            yield sse_event({'type': 'error', 'content': f'Chunk {i+1} failed'})
+                finally:
+                    for task in tasks:
+                        task.cancel()
+
                 if full_final:
-                    db.save_message(request.chat_id, "assistant", full_final.strip())
+                    await db.enqueue_message(request.chat_id, "assistant", full_final.strip())
                     background_tasks.add_task(db.update_chat_title, request.chat_id, request.model)
             
-            return StreamingResponse(
-                generate_chunked_response(),
-                media_type="text/event-stream",
-                headers={
-                    'Cache-Control': 'no-cache',
-                    'Connection': 'keep-alive',
-                    'Content-Type': 'text/event-stream'
-                }
-            )
+            return sse(generate_chunked_response())
         else:
             async def generate_response():
                 final_answer = ""
                 reasoning = Reasoning(model_name=request.model, context_str=context_str)
-                async for event in reasoning.perform_chain_of_thought_reasoning(user_message):
-                    logger.debug(f"Received event: {event}")
-                    yield f"data: {json.dumps(event)}\n\n"
-                    if event.get("type") == "final":
-                        final_answer += event.get("content", "")
+                async with OLLAMA_SEM:
+                    async for event in reasoning.perform_chain_of_thought_reasoning(user_message):
+                        logger.debug(f"Received event: {event}")
+                        yield sse_event(event)
+                        if event.get("type") == "final":
+                            final_answer += event.get("content", "")
                 
                 await reasoning.close()
                 
                 if final_answer:
-                    db.save_message(request.chat_id, "assistant", final_answer.strip())
+                    await db.enqueue_message(request.chat_id, "assistant", final_answer.strip())
                     background_tasks.add_task(db.update_chat_title, request.chat_id, request.model)
             
-            return StreamingResponse(
-                generate_response(),
-                media_type="text/event-stream",
-                headers={
-                    'Cache-Control': 'no-cache',
-                    'Connection': 'keep-alive',
-                    'Content-Type': 'text/event-stream'
-                }
-            )
+            return sse(generate_response())
@@ -1,8 +1,11 @@
 # api/files.py
 from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
-from fastapi.responses import Response, FileResponse
+from fastapi.responses import FileResponse, Response
+import asyncio
 import os
-import shutil
+import sys
+import aiofiles
+from pathlib import Path
 from core.config import settings
 from core.security import get_current_user
 from database.manager import DatabaseManager
@@ -10,36 +13,76 @@ from database.manager import DatabaseManager
 router = APIRouter(prefix="/files", tags=["files"])
 db = DatabaseManager()
 
+# sendfile to a regular file is Linux-specific; elsewhere (and for
+# uploads still spooled in memory) we fall back to chunked copying.
+_USE_SENDFILE = hasattr(os, "sendfile") and sys.platform.startswith("linux")
+
+def _chat_file_path(chat_id: int, filename: str) -> Path:
+    """Resolve a per-chat upload path, rejecting path-traversal names."""
+    if not filename or filename != os.path.basename(filename) or ".." in filename:
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    return Path(settings.UPLOAD_DIR) / str(chat_id) / filename
+
 @router.post("/{chat_id}/upload")
 async def upload_file(
     chat_id: int,
     file: UploadFile = File(...),
     current_user: str = Depends(get_current_user)
 ):
-    if not db.verify_chat_ownership(chat_id, current_user):
+    if not await db.verify_chat_ownership(chat_id, current_user):
         raise HTTPException(status_code=403, detail="Not authorized to access this chat")
         
-    file_path = os.path.join(settings.UPLOAD_DIR, f"{chat_id}_{file.filename}")
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    return {"filename": file.filename, "path": file_path}
+    file_path = _chat_file_path(chat_id, file.filename)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    # Large uploads have already been spooled to a temp file by
+    # Starlette; copy those kernel-to-kernel with sendfile instead of
+    # looping the bytes through userspace. Small (in-memory) uploads
+    # and non-Linux hosts take the chunked path below — rolling a
+    # memory spool to disk just to sendfile it back would be a net loss.
+    spool = file.file
+    if _USE_SENDFILE and getattr(spool, "_rolled", False):
+        def _sendfile_copy():
+            spool.flush()
+            in_fd = spool.fileno()
+            size = os.fstat(in_fd).st_size
+            out_fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                offset = 0
+                while offset < size:
+                    sent = os.sendfile(out_fd, in_fd, offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+            finally:
+                os.close(out_fd)
+        await asyncio.to_thread(_sendfile_copy)
+        return {"filename": file.filename, "path": str(file_path)}
+    # Copy in async chunks so a large upload doesn't block the event
+    # loop; 1MB chunks keep the syscall count low for big files without
+    # holding more than one chunk in memory.
+    async with aiofiles.open(file_path, "wb") as buffer:
+        while chunk := await file.read(1 << 20):
+            await buffer.write(chunk)
+    return {"filename": file.filename, "path": str(file_path)}
 
 @router.get("/export/{chat_id}")
 async def export_chat(
     chat_id: int,
     current_user: str = Depends(get_current_user)
 ):
-    if not db.verify_chat_ownership(chat_id, current_user):
+    if not await db.verify_chat_ownership(chat_id, current_user):
         raise HTTPException(status_code=403, detail="Not authorized to access this chat")
         
-    messages = db.get_chat_messages(chat_id)
-    transcript = ""
-    for msg in messages:
-        transcript += f"{msg['role'].upper()}: {msg['content']}\n"
+    messages = await db.get_chat_messages(chat_id)
 
+    # The messages are already fully in memory, so one join + encode
+    # beats both += concatenation (quadratic reallocation) and a
+    # per-message streaming generator (one ASGI send per message). A
+    # sized bytes body also gets a Content-Length and gzip compression.
+    transcript = "".join(f"{msg['role'].upper()}: {msg['content']}\n" for msg in messages)
     return Response(
-        content=transcript,
-        media_type="text/plain",
+        content=transcript.encode("utf-8"),
+        media_type="text/plain; charset=utf-8",
         headers={"Content-Disposition": f"attachment; filename=chat_{chat_id}.txt"}
     )
 
@@ -49,10 +92,22 @@ async def get_file(
     filename: str,
     current_user: str = Depends(get_current_user)
 ):
-    if not db.verify_chat_ownership(chat_id, current_user):
+    if not await db.verify_chat_ownership(chat_id, current_user):
         raise HTTPException(status_code=403, detail="Not authorized to access this chat")
         
-    file_path = os.path.join(settings.UPLOAD_DIR, f"{chat_id}_{filename}")
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(file_path)
+    file_path = _chat_file_path(chat_id, filename)
+    # Single stat: reuse it in the response instead of an exists() pre-check.
+    try:
+        stat_result = os.stat(file_path)
+    except FileNotFoundError:
+        # Files uploaded before the per-chat directories lived flat as
+        # uploads/{chat_id}_{filename}; move such a file into place on
+        # first access so pre-existing uploads keep resolving.
+        legacy_path = Path(settings.UPLOAD_DIR) / f"{chat_id}_{filename}"
+        try:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(legacy_path, file_path)
+            stat_result = os.stat(file_path)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="File not found")
+    return FileResponse(file_path, stat_result=stat_result)
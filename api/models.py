@@ -1,54 +1,90 @@
 # api/models.py
-from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException
-import httpx
+from fastapi import APIRouter, Depends, HTTPException
 import asyncio
-from typing import Dict, List
+import hashlib
+import time
+from typing import Dict, List, Optional
 from core.security import get_current_user
-from core.config import settings
+from core.http import ollama_client
 
 router = APIRouter(prefix="/models", tags=["models"])
 
-# Global state for available models
+MODELS_TTL_SECONDS = 30
+# Failed refreshes back off exponentially up to this ceiling, so an
+# Ollama outage costs one probe every few minutes instead of one per
+# request once the cache has gone stale.
+MODELS_MAX_BACKOFF_SECONDS = 300
+
+# Global state for available models, refreshed on demand with a TTL
+# instead of by a background polling task.
 available_models: Dict[str, dict] = {}
+_chat_models: List[dict] = []
+# Response envelope for /models, rebuilt only when the tag list changes
+# so the handler returns a ready-made object.
+_chat_models_payload: Dict[str, List[dict]] = {"models": _chat_models}
+_models_fetched_at: float = 0.0
+_refresh_lock = asyncio.Lock()
+_tags_hash: Optional[bytes] = None
+_backoff: float = 1.0
+_retry_at: float = 0.0
 
 async def fetch_models() -> List[Dict]:
-    """Fetch models from Ollama immediately."""
+    """Fetch models from Ollama and rebuild the cached views."""
+    global _chat_models, _models_fetched_at, _tags_hash, _backoff, _retry_at
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{settings.OLLAMA_API_URL}/api/tags")
-            if response.status_code == 200:
-                models_data = response.json()
-                available_models.clear()
-                for model in models_data.get('models', []):
-                    available_models[model['name']] = {
-                        'name': model['name'],
-                        'modified_at': model.get('modified_at', ''),
-                        'size': model.get('size', 0)
-                    }
+        response = await ollama_client.get("/api/tags")
+        if response.status_code == 200:
+            _backoff = 1.0
+            _models_fetched_at = time.monotonic()
+            # The tag list rarely changes between refreshes; hashing the
+            # raw body skips the parse and dict rebuild when it hasn't.
+            body_hash = hashlib.md5(response.content).digest()
+            if body_hash == _tags_hash:
                 return list(available_models.values())
+            models_data = response.json()
+            available_models.clear()
+            for model in models_data.get('models', []):
+                available_models[model['name']] = {
+                    'name': model['name'],
+                    'modified_at': model.get('modified_at', ''),
+                    'size': model.get('size', 0)
+                }
+            # Filter out embedding models once per refresh, not per request.
+            _chat_models = [m for m in available_models.values() if "-embedding" not in m["name"]]
+            _chat_models_payload["models"] = _chat_models
+            _tags_hash = body_hash
+            return list(available_models.values())
     except Exception as e:
         print(f"Error fetching models: {e}")
-        return []
+    _backoff = min(_backoff * 2, MODELS_MAX_BACKOFF_SECONDS)
+    _retry_at = time.monotonic() + _backoff
+    return []
+
+async def refresh_models_if_stale() -> None:
+    """Refetch the model list when the cache is older than the TTL.
 
-async def poll_models():
-    """Poll Ollama for available models periodically."""
-    while True:
-        await fetch_models()
-        await asyncio.sleep(30)
+    The lock coalesces concurrent callers into a single upstream
+    request, and the backoff window set by a failed fetch suppresses
+    retries entirely while it lasts.
+    """
+    now = time.monotonic()
+    if _chat_models and now - _models_fetched_at <= MODELS_TTL_SECONDS:
+        return
+    if now < _retry_at:
+        return
+    async with _refresh_lock:
+        now = time.monotonic()
+        if now < _retry_at:
+            return
+        if not _chat_models or now - _models_fetched_at > MODELS_TTL_SECONDS:
+            await fetch_models()
 
 @router.get("")
 async def get_models(current_user: str = Depends(get_current_user)):
     """Get list of available chat models."""
-    # If no models are available, fetch them immediately
-    if not available_models:
-        models = await fetch_models()
-    else:
-        models = [m for m in available_models.values()]
-    
-    # Filter out embedding models
-    models = [m for m in models if "-embedding" not in m["name"]]
-    
-    if not models:
+    await refresh_models_if_stale()
+
+    if not _chat_models:
         raise HTTPException(status_code=503, detail="No models available")
-        
-    return {"models": models}
\ No newline at end of file
+
+    return _chat_models_payload
@@ -12,7 +12,7 @@ async def set_preferences(
     preferences: UserPreferences,  # Ensure your pydantic model includes use_reasoning: bool
     current_user: str = Depends(get_current_user)
 ):
-    db.set_user_preferences(
+    await db.set_user_preferences(
         current_user,
         preferences.default_model,
         preferences.theme,
@@ -23,7 +23,7 @@ async def set_preferences(
 
 @router.get("")
 async def get_preferences(current_user: str = Depends(get_current_user)):
-    default_model, theme, default_system_prompt, use_reasoning = db.get_user_preferences(current_user)
+    default_model, theme, default_system_prompt, use_reasoning = await db.get_user_preferences(current_user)
     return {
         "default_model": default_model,
         "theme": theme,
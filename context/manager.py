@@ -1,21 +1,142 @@
 # context/manager.py
+import atexit
+import hashlib
 import os
 import json
+import threading
+import weakref
+from collections import OrderedDict, deque
+from functools import lru_cache
 from typing import List, Dict, Optional
 import logging
 import httpx
 import numpy as np
 import hnswlib
+import torch
 from sentence_transformers import SentenceTransformer
+from context.tokenizer import _get_encoder
 from core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Configure PyTorch's thread pools once at import: some environments
+# default to a single intra-op thread, which serializes the transformer
+# MatMuls that dominate encode time. Pin OMP/MKL to the same count so
+# they don't oversubscribe the cores alongside hnswlib's own threads.
+torch.set_num_threads(int(os.environ.get("KODAH_TORCH_THREADS", os.cpu_count() or 1)))
+torch.set_num_interop_threads(2)
+os.environ.setdefault("OMP_NUM_THREADS", str(torch.get_num_threads()))
+os.environ.setdefault("MKL_NUM_THREADS", str(torch.get_num_threads()))
+
+# LRU of normalized query embeddings keyed by content hash: repeated
+# queries skip the transformer forward pass — the hot spot — entirely.
+# Guarded by a lock like the auth cache in database.manager: lookups
+# run in to_thread workers, so concurrent requests reach this dict from
+# different threads and an unguarded move_to_end can race an eviction.
+_EMBED_CACHE_MAX = 2048
+_embed_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+_embed_cache_lock = threading.Lock()
+
+def _text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+def _message_key(message: Dict[str, str]) -> bytes:
+    """Stable identity hash for a message, used to skip re-ingesting
+    history that is already in the index."""
+    return hashlib.blake2b(
+        json.dumps(message, sort_keys=True).encode(), digest_size=16
+    ).digest()
+
+# One embedder per backend, shared by every ContextManager: loading the
+# model means reading ~420MB of weights, so per-chat instances would
+# multiply both startup latency and resident memory by the chat count.
+_embedders: Dict[str, object] = {}
+_embedder_dims: Dict[str, int] = {}
+_embedder_lock = threading.Lock()
+
+def _get_embedder():
+    """Return the process-wide embedder (and its dimension) for the
+    configured backend, loading it on first use."""
+    backend = settings.EMBED_BACKEND
+    with _embedder_lock:
+        embedder = _embedders.get(backend)
+        if embedder is None:
+            if backend == "onnx":
+                from context.onnx_embedder import OnnxEmbedder
+                embedder = OnnxEmbedder(settings.EMBED_ONNX_PATH)
+            else:
+                # Ensure the model is only downloaded once
+                model_dir = os.path.expanduser("~/.cache/huggingface/transformers")
+                model_path = os.path.join(model_dir, 'sentence-transformers', 'all-mpnet-base-v2')
+                if not os.path.exists(model_path):
+                    logger.info(f"Model not found locally at {model_path}. It will be downloaded.")
+                embedder = SentenceTransformer('all-mpnet-base-v2', cache_folder=model_dir)
+            _embedders[backend] = embedder
+            _embedder_dims[backend] = embedder.get_sentence_embedding_dimension()
+        return embedder, _embedder_dims[backend]
+
+# Summarization calls reuse one keepalive client instead of opening a
+# fresh TCP connection per httpx.post. Plain HTTP/1.1: the Ollama URL
+# is cleartext http, so HTTP/2 can never be negotiated anyway.
+_http = httpx.Client(
+    base_url=settings.OLLAMA_API_URL,
+    timeout=60.0,
+    limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=300),
+    trust_env=False,
+)
+
+# Shared BPE encoder for token counting; tiktoken's Rust encode is fast
+# enough that the exact count costs little more than the old chars//3
+# heuristic, and exact counts waste none of the context window.
+_token_encoder = _get_encoder("gpt-3.5-turbo")
+
+@lru_cache(maxsize=4096)
+def _estimate_message_tokens(content: str) -> int:
+    """Exact token count for a single message body plus per-message
+    formatting overhead. Cached so messages that are re-measured every
+    turn (and for every chunk in the chunked path) only pay once.
+    """
+    message_overhead = 4
+    return len(_token_encoder.encode(content)) + message_overhead
+
+# Managers with unflushed saves, keyed by index path and held weakly: a
+# single process-level atexit hook flushes whichever are still alive at
+# shutdown. Registering per instance would pin every request's manager
+# in memory forever and replay stale flushes in LIFO order at exit,
+# letting the oldest copy of a chat's index overwrite the newest.
+_live_managers: "weakref.WeakValueDictionary[str, ContextManager]" = weakref.WeakValueDictionary()
+
+def _flush_live_managers() -> None:
+    for manager in list(_live_managers.values()):
+        manager.flush()
+
+atexit.register(_flush_live_managers)
+
+def _migrate_legacy_memory_texts(jsonl_path: str) -> None:
+    """One-shot migration of a pre-JSONL memory file (a single JSON array
+    at the same path with a .json suffix) to the append-only JSONL log,
+    so existing chats keep their indexed memory."""
+    if not jsonl_path.endswith(".jsonl"):
+        return
+    legacy_path = jsonl_path[:-len(".jsonl")] + ".json"
+    if not os.path.exists(legacy_path):
+        return
+    try:
+        with open(legacy_path, "r", encoding="utf-8") as f:
+            messages = json.load(f)
+        with open(jsonl_path, "w", encoding="utf-8") as f:
+            for message in messages:
+                f.write(json.dumps(message) + "\n")
+        os.remove(legacy_path)
+        logger.info(f"Migrated legacy memory texts file {legacy_path} to JSONL.")
+    except Exception as e:
+        logger.error(f"Error migrating legacy memory texts file {legacy_path}: {e}")
+
 def get_index_path(chat_id: int) -> str:
     return getattr(settings, "CONTEXT_INDEX_PATH_TEMPLATE", "context_index_{chat_id}.bin").format(chat_id=chat_id)
 
 def get_memory_texts_path(chat_id: int) -> str:
-    return getattr(settings, "CONTEXT_TEXTS_PATH_TEMPLATE", "context_texts_{chat_id}.json").format(chat_id=chat_id)
+    return getattr(settings, "CONTEXT_TEXTS_PATH_TEMPLATE", "context_texts_{chat_id}.jsonl").format(chat_id=chat_id)
 
 def get_summary_path(chat_id: int) -> str:
     return getattr(settings, "CONTEXT_SUMMARY_PATH_TEMPLATE", "global_summary_{chat_id}.txt").format(chat_id=chat_id)
@@ -38,22 +159,25 @@ class ContextManager:
         self.memory_texts_path = get_memory_texts_path(chat_id)
         self.summary_path = get_summary_path(chat_id)
 
-        # Ensure the model is only downloaded once
-        model_dir = os.path.expanduser("~/.cache/huggingface/transformers")
-        model_path = os.path.join(model_dir, 'sentence-transformers', 'all-mpnet-base-v2')
-        
-        if not os.path.exists(model_path):
-            logger.info(f"Model not found locally at {model_path}. It will be downloaded.")
-        
-        self.embedder = SentenceTransformer('all-mpnet-base-v2', cache_folder=model_dir)
-        self.embedding_dim = self.embedder.get_sentence_embedding_dimension()
+        self.embedder, self.embedding_dim = _get_embedder()
 
         self.index = hnswlib.Index(space='cosine', dim=self.embedding_dim)
+        if not os.path.exists(self.memory_texts_path):
+            _migrate_legacy_memory_texts(self.memory_texts_path)
         if os.path.exists(self.index_path) and os.path.exists(self.memory_texts_path):
             try:
                 self.index.load_index(self.index_path)
                 with open(self.memory_texts_path, "r", encoding="utf-8") as f:
-                    self.memory_texts = json.load(f)
+                    self.memory_texts = [json.loads(line) for line in f if line.strip()]
+                # The texts log is appended per batch while the index is only
+                # saved on a threshold/flush; after a crash the log can run
+                # ahead of the index, so trim it back to what the index knows.
+                if len(self.memory_texts) > self.index.element_count:
+                    logger.warning(
+                        f"Memory texts ahead of index for chat_id {chat_id}; "
+                        f"trimming {len(self.memory_texts) - self.index.element_count} entries."
+                    )
+                    self.memory_texts = self.memory_texts[:self.index.element_count]
                 logger.info(f"Loaded persisted context for chat_id {chat_id} from disk.")
             except Exception as e:
                 logger.error(f"Error loading persisted context for chat_id {chat_id}: {e}")
@@ -61,6 +185,20 @@ class ContextManager:
         else:
             self._init_new_index(max_elements)
 
+        # Identity hashes of everything already indexed: optimize_messages
+        # passes the full history each turn, and without this the whole
+        # chat would be re-embedded and re-persisted every time.
+        self._ingested_hashes = {_message_key(m) for m in self.memory_texts}
+
+        # Coalesce index saves: an index save is O(N) while an insert is
+        # O(1), so persist only every _save_every adds or on flush/exit.
+        self._dirty_count = 0
+        self._save_every = 32
+        # Weak registration: the newest manager for this chat is flushed
+        # by the process-level exit hook; dropped instances just get
+        # collected instead of being pinned by atexit.
+        _live_managers[self.index_path] = self
+
         if os.path.exists(self.summary_path):
             with open(self.summary_path, "r", encoding="utf-8") as f:
                 self.global_summary = f.read().strip()
@@ -68,22 +206,42 @@ class ContextManager:
             self.global_summary = ""
 
     def _init_new_index(self, max_elements: int):
-        """Initialize a new index and empty memory."""
+        """Initialize a new index and empty memory.
+
+        Vectors are held at float32: hnswlib has no fp16/int8 storage, and
+        since retrieval reads candidates straight out of the index there is
+        no separate embedding buffer left to quantize. Revisit if the index
+        is ever swapped for a backend with quantized storage.
+        """
         self.index.init_index(max_elements=max_elements, ef_construction=200, M=16)
         self.index.set_ef(50)
         self.memory_texts = []
         logger.info("Initialized new advanced hnswlib index.")
 
     def save_context(self) -> None:
-        """Persist the index and memory texts to disk."""
+        """Persist the index to disk; memory texts are appended incrementally."""
         try:
             self.index.save_index(self.index_path)
-            with open(self.memory_texts_path, "w", encoding="utf-8") as f:
-                json.dump(self.memory_texts, f)
-            logger.info("Saved context to disk.")
+            self._dirty_count = 0
+            logger.info("Saved context index to disk.")
         except Exception as e:
             logger.error(f"Error saving context: {e}")
 
+    def _append_memory_texts(self, messages: List[Dict[str, str]]) -> None:
+        """Append new messages to the JSONL log — O(new) instead of
+        rewriting the whole memory file per add."""
+        try:
+            with open(self.memory_texts_path, "a", encoding="utf-8") as f:
+                for message in messages:
+                    f.write(json.dumps(message) + "\n")
+        except Exception as e:
+            logger.error(f"Error appending memory texts: {e}")
+
+    def flush(self) -> None:
+        """Persist any index changes that the save debounce is still holding."""
+        if self._dirty_count:
+            self.save_context()
+
     def save_global_summary(self) -> None:
         """Persist the global summary to disk."""
         try:
@@ -103,20 +261,99 @@ class ContextManager:
             except Exception as e:
                 logger.error(f"Error deleting file {path}: {e}")
 
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Encode a batch of texts with length-sorted (smart) batching.
+
+        Sorting by length before batching keeps each batch's padding to a
+        minimum, so the transformer spends far fewer FLOPs on pad tokens;
+        results are unshuffled back to input order before returning.
+        """
+        order = np.argsort([len(t) for t in texts])
+        sorted_texts = [texts[i] for i in order]
+        with torch.inference_mode():
+            embeddings = self.embedder.encode(
+                sorted_texts,
+                batch_size=32,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            )
+        out = np.empty_like(embeddings)
+        out[order] = embeddings
+        return out
+
     def add_to_memory(self, message: Dict[str, str]) -> None:
         """Compute and add the message embedding to the index and memory_texts; then persist."""
-        text = message["content"]
-        if text.strip():
-            embedding = self.embedder.encode(text, convert_to_numpy=True)
-            norm = np.linalg.norm(embedding)
-            if norm > 0:
-                embedding = embedding / norm
-            embedding = np.expand_dims(embedding, axis=0)
-            self.index.add_items(embedding)
-            self.memory_texts.append(message)
-            logger.debug(f"Added message to advanced memory: {text[:50]}...")
+        self._add_many([message])
+
+    def _add_many(self, messages: List[Dict[str, str]]) -> None:
+        """Embed and index a batch of messages with one encode call.
+
+        Batching the transformer forward pass amortizes per-call overhead
+        that a message-at-a-time loop pays, and the index and memory texts
+        are persisted once per batch instead of once per message.
+        """
+        kept = []
+        for message in messages:
+            if not message["content"].strip():
+                continue
+            key = _message_key(message)
+            if key in self._ingested_hashes:
+                continue
+            self._ingested_hashes.add(key)
+            kept.append(message)
+        if not kept:
+            return
+        # Grow capacity geometrically at 80% occupancy: resize_index is an
+        # O(N) graph copy, so doubling keeps it amortized O(1) per insert
+        # instead of hnswlib refusing adds at the fixed ceiling.
+        capacity = self.index.get_max_elements()
+        if self.index.element_count + len(kept) > capacity * 0.8:
+            new_capacity = max(capacity * 2, self.index.element_count + len(kept))
+            self.index.resize_index(new_capacity)
+            logger.info(f"Resized hnswlib index for chat_id {self.chat_id}: {capacity} -> {new_capacity} elements.")
+        embeddings = self._encode([m["content"] for m in kept])
+        start = len(self.memory_texts)
+        self.index.add_items(embeddings, np.arange(start, start + len(kept)))
+        self.memory_texts.extend(kept)
+        logger.debug(f"Added {len(kept)} messages to advanced memory.")
+        self._append_memory_texts(kept)
+        self._dirty_count += len(kept)
+        if self._dirty_count >= self._save_every:
             self.save_context()
 
+    def _generate(self, prompt: str) -> Optional[str]:
+        """Call the generate endpoint with streaming, accumulating the
+        line-delimited response pieces as they arrive so peak memory is
+        one line of JSON rather than the whole response body."""
+        try:
+            with _http.stream(
+                "POST",
+                "/api/generate",
+                json={"model": self.model, "prompt": prompt, "stream": True},
+            ) as response:
+                if response.status_code != 200:
+                    logger.error(f"Summarization API error: {response.status_code}")
+                    return None
+                parts = []
+                for line in response.iter_lines():
+                    if line:
+                        parts.append(json.loads(line).get("response", ""))
+            return "".join(parts).strip()
+        except Exception as e:
+            logger.error(f"Error calling summarization API: {e}")
+            return None
+
+    def _summarize_text(self, conversation_text: str, prompt_prefix: str) -> Optional[str]:
+        """Summarize conversation text, map-reducing when it would not fit
+        the model's context window: summarize each chunk, then summarize
+        the concatenated partial summaries."""
+        chunks = self.chunk_text(conversation_text, self.max_context_length // 2, 64)
+        if len(chunks) > 1:
+            partials = [self._generate(f"{prompt_prefix}\n\n{chunk}\n\nSummary:") for chunk in chunks]
+            conversation_text = "\n".join(p for p in partials if p)
+        return self._generate(f"{prompt_prefix}\n\n{conversation_text}\n\nSummary:")
+
     def update_global_summary(self, messages: List[Dict[str, str]]) -> None:
         """
         Update the global rolling summary using a summarization API.
@@ -125,55 +362,78 @@ class ContextManager:
         if len(messages) > 10:
             to_summarize = messages[:-10]
             conversation_text = "\n".join([f"{m['role']}: {m['content']}" for m in to_summarize])
-            prompt = (
-                "Summarize the following conversation, keeping all key details:\n\n"
-                f"{conversation_text}\n\nSummary:"
+            summary = self._summarize_text(
+                conversation_text,
+                "Summarize the following conversation, keeping all key details:"
             )
-            try:
-                response = httpx.post(
-                    f"{settings.OLLAMA_API_URL}/api/generate",
-                    json={"model": self.model, "prompt": prompt, "stream": False},
-                    timeout=60.0,
-                )
-                if response.status_code == 200:
-                    data = response.json()
-                    summary = data.get("response", "").strip()
-                    self.global_summary = summary
-                    self.save_global_summary()
-                    logger.info("Updated global summary.")
-                else:
-                    logger.error(f"Global summarization API error: {response.status_code}")
-            except Exception as e:
-                logger.error(f"Error in global summarization: {e}")
+            if summary is not None:
+                self.global_summary = summary
+                self.save_global_summary()
+                logger.info("Updated global summary.")
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        """Return the normalized query embedding as a (1, dim) array,
+        cached by content hash. normalize_embeddings=True does the L2
+        normalize on the torch tensor inside encode, and passing a list
+        yields the 2D shape knn_query wants without an expand_dims."""
+        key = _text_key(query)
+        with _embed_cache_lock:
+            cached = _embed_cache.get(key)
+            if cached is not None:
+                _embed_cache.move_to_end(key)
+                return cached
+        with torch.inference_mode():
+            embedding = self.embedder.encode([query], convert_to_numpy=True, normalize_embeddings=True)
+        with _embed_cache_lock:
+            _embed_cache[key] = embedding
+            if len(_embed_cache) > _EMBED_CACHE_MAX:
+                _embed_cache.popitem(last=False)
+        return embedding
 
     def retrieve_relevant_context(self, query: str, limit: int = 5) -> List[Dict[str, str]]:
         """Retrieve up to 'limit' messages from the index that are most similar to the query."""
-        if not self.memory_texts or self.index.element_count == 0:
+        count = self.index.element_count
+        if not self.memory_texts or count == 0:
             return []
-        k = min(limit, self.index.element_count)
-        self.index.set_ef(1000)
-        embedding = self.embedder.encode(query, convert_to_numpy=True)
-        norm = np.linalg.norm(embedding)
-        if norm > 0:
-            embedding = embedding / norm
-        embedding = np.expand_dims(embedding, axis=0)
-        labels, _ = self.index.knn_query(embedding, k=k)
-        candidates = []
-        query_emb = embedding[0]
-        for idx in labels[0]:
-            if idx < len(self.memory_texts):
-                candidate = self.memory_texts[idx]
-                candidate_emb = self.embedder.encode(candidate["content"], convert_to_numpy=True)
-                cand_norm = np.linalg.norm(candidate_emb)
-                if cand_norm > 0:
-                    candidate_emb = candidate_emb / cand_norm
-                sim = np.dot(query_emb, candidate_emb)
-                candidates.append((sim, candidate))
-        candidates.sort(key=lambda x: x[0], reverse=True)
-        retrieved = [c[1] for c in candidates[:limit]]
+        k = min(limit, count)
+        # Scale the search beam with k rather than pinning ef=1000: on
+        # small memories the wide beam just burns distance computations
+        # for identical results.
+        self.index.set_ef(max(50, min(1000, 8 * k)))
+        embedding = self._embed_query(query)
+        # The index is built with space='cosine' on normalized vectors, so
+        # 1 - distance is already the cosine similarity and knn_query
+        # returns labels sorted best-first — no rerank pass is needed. If a
+        # higher-precision rerank is ever reintroduced, batch it: encode all
+        # candidates in one _encode call and score with a single matmul,
+        # never per-candidate encode/dot in a Python loop.
+        # A single query row gains nothing from fanning out across
+        # threads; batched lookups go through retrieve_batch instead.
+        labels, distances = self.index.knn_query(embedding, k=k, num_threads=1)
+        retrieved = [self.memory_texts[int(idx)] for idx in labels[0][:limit] if idx < len(self.memory_texts)]
         logger.debug(f"Advanced retrieval returned {len(retrieved)} messages for query: {query[:50]}...")
         return retrieved
 
+    def retrieve_batch(self, queries: List[str], limit: int = 5) -> List[List[Dict[str, str]]]:
+        """Retrieve relevant messages for several queries in one ANN call.
+
+        Submitting all query vectors to a single knn_query lets hnswlib
+        parallelize the graph traversals across threads and amortizes the
+        per-call overhead that one-query-per-turn lookups pay; use this
+        from any caller that scores multiple queries at once.
+        """
+        count = self.index.element_count
+        if not queries or not self.memory_texts or count == 0:
+            return [[] for _ in queries]
+        k = min(limit, count)
+        self.index.set_ef(max(50, min(1000, 8 * k)))
+        embeddings = self._encode(queries)
+        labels, distances = self.index.knn_query(embeddings, k=k, num_threads=os.cpu_count() or 1)
+        return [
+            [self.memory_texts[int(idx)] for idx in row if idx < len(self.memory_texts)]
+            for row in labels
+        ]
+
     def optimize_messages(self, messages: List[Dict[str, str]], system_prompt: Optional[str] = None) -> List[Dict[str, str]]:
         """
         Build the final prompt by combining:
@@ -188,66 +448,62 @@ class ContextManager:
         else:
             base = [{"role": "system", "content": "You are a helpful assistant."}]
         
-        for msg in messages:
-            self.add_to_memory(msg)
-        
+        self._add_many(messages)
+
+        # Fast path: when the whole conversation fits under the budget
+        # (with headroom for the reply), skip summarization, retrieval and
+        # trimming entirely — the common case early in a conversation.
+        if self._estimate_tokens(base) + self._estimate_tokens(messages) + 1000 <= self.max_context_length:
+            return base + list(messages)
+
         self.update_global_summary(messages)
-        
+
         recent = messages[-10:] if len(messages) > 10 else messages
         candidate = base
         if self.global_summary:
             candidate.append({"role": "assistant", "content": f"Summary of earlier conversation: {self.global_summary}"})
         candidate += recent
         
-        retrieved = self.retrieve_relevant_context(messages[-1]["content"]) if messages else []
-        candidate_with_retrieval = candidate + retrieved
-        while self._estimate_tokens(candidate_with_retrieval) > self.max_context_length and retrieved:
-            retrieved.pop(0)
-            candidate_with_retrieval = candidate + retrieved
-        
-        return candidate_with_retrieval
+        retrieved = deque(self.retrieve_relevant_context(messages[-1]["content"])) if messages else deque()
+        # Trim oldest retrieved messages with a running total instead of
+        # re-concatenating and re-estimating the whole candidate list per
+        # drop; per-message estimates come from the lru_cache above, so
+        # each pop is an O(1) subtraction with no re-measuring.
+        total_tokens = self._estimate_tokens(candidate) + self._estimate_tokens(retrieved)
+        while total_tokens > self.max_context_length and retrieved:
+            dropped = retrieved.popleft()
+            total_tokens -= _estimate_message_tokens(dropped["content"])
+
+        return candidate + list(retrieved)
 
     def summarize_context(self, messages: List[Dict[str, str]]) -> str:
         """Summarize the provided messages using the generate endpoint."""
         conversation_text = "\n".join([f"{m['role']}: {m['content']}" for m in messages])
-        prompt = (
-            "Summarize the following conversation concisely while retaining all important details:\n\n"
-            f"{conversation_text}\n\nSummary:"
+        summary = self._summarize_text(
+            conversation_text,
+            "Summarize the following conversation concisely while retaining all important details:"
         )
-        try:
-            response = httpx.post(
-                f"{settings.OLLAMA_API_URL}/api/generate",
-                json={"model": self.model, "prompt": prompt, "stream": False},
-                timeout=60.0,
-            )
-            if response.status_code == 200:
-                data = response.json()
-                summary = data.get("response", "").strip()
-                return summary if summary else "Summary not available."
-            else:
-                logger.error(f"Summarization API error: {response.status_code}")
-                return "Summary not available."
-        except Exception as e:
-            logger.error(f"Error summarizing conversation: {e}")
-            return "Summary not available."
+        return summary if summary else "Summary not available."
 
     def _estimate_tokens(self, messages: List[Dict[str, str]]) -> int:
-        total_chars = sum(len(m["content"]) for m in messages)
-        char_per_token = 3
-        message_overhead = len(messages) * 4
-        return (total_chars // char_per_token) + message_overhead
+        return sum(_estimate_message_tokens(m["content"]) for m in messages)
 
     def chunk_text(self, text: str, max_tokens: int, overlap_tokens: int) -> List[str]:
-        tokens = text.split()
-        if len(tokens) <= max_tokens:
+        """Split text into overlapping chunks by token-ID slices.
+
+        Encoding once with tiktoken and slicing the id array gives chunks
+        of exactly max_tokens tokens — no 20-40% drift from character
+        heuristics on punctuation, code or CJK text — and the Rust
+        encode/decode is faster than building intermediate Python word
+        lists for large inputs.
+        """
+        ids = _token_encoder.encode(text)
+        if len(ids) <= max_tokens:
             return [text]
+        step = max_tokens - overlap_tokens
         chunks = []
-        start = 0
-        while start < len(tokens):
-            end = start + max_tokens
-            chunk = " ".join(tokens[start:end])
-            chunks.append(chunk)
-            if end >= len(tokens):
+        for start in range(0, len(ids), step):
+            chunks.append(_token_encoder.decode(ids[start:start + max_tokens]))
+            if start + max_tokens >= len(ids):
                 break
-            start += max_tokens - overlap_tokens
         return chunks
@@ -0,0 +1,62 @@
+# context/onnx_embedder.py
+import os
+import numpy as np
+
+class OnnxEmbedder:
+    """SentenceTransformer-compatible encoder backed by ONNX Runtime.
+
+    Loads a pre-exported feature-extraction model (produced with
+    `optimum-cli export onnx --model sentence-transformers/all-mpnet-base-v2
+    --task feature-extraction`) and reproduces the mean-pooling head, so
+    ContextManager can swap backends without touching its encode calls.
+    onnxruntime with full graph optimization is typically 2-4x faster than
+    stock PyTorch on CPU for this model.
+    """
+
+    def __init__(self, model_path: str, tokenizer_name: str = "sentence-transformers/all-mpnet-base-v2"):
+        # Imported lazily: onnxruntime is only needed when this backend is
+        # selected via settings.EMBED_BACKEND.
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session_options.intra_op_num_threads = os.cpu_count()
+        self.session = onnxruntime.InferenceSession(
+            model_path,
+            sess_options=session_options,
+            providers=["CPUExecutionProvider"],
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+        self._dim = None
+
+    def get_sentence_embedding_dimension(self) -> int:
+        if self._dim is None:
+            self._dim = int(self.encode([" "], convert_to_numpy=True).shape[1])
+        return self._dim
+
+    def encode(self, texts, batch_size: int = 32, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False, show_progress_bar: bool = False):
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+
+        pooled_batches = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            encoded = self.tokenizer(batch, padding=True, truncation=True, return_tensors="np")
+            feeds = {name: value for name, value in encoded.items() if name in self._input_names}
+            hidden = self.session.run(None, feeds)[0]
+            # Mean pooling over non-padding tokens, as in the original model.
+            mask = encoded["attention_mask"][..., None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled_batches.append(pooled)
+
+        embeddings = np.vstack(pooled_batches)
+        if normalize_embeddings:
+            norms = np.sqrt(np.einsum('ij,ij->i', embeddings, embeddings))
+            np.divide(embeddings, norms[:, None], out=embeddings, where=norms[:, None] > 0)
+        if single:
+            return embeddings[0]
+        return embeddings
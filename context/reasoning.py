@@ -1,21 +1,40 @@
 import httpx
-import json
 import logging
 from core.config import settings
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# One client shared by every Reasoning instance so all four stages of a
+# chain (and concurrent chains) reuse the same keepalive connections
+# instead of paying TCP setup per call. Plain HTTP/1.1: the Ollama URL
+# is cleartext http, so HTTP/2 can never be negotiated anyway.
+_client = httpx.AsyncClient(
+    base_url=settings.OLLAMA_API_URL,
+    timeout=httpx.Timeout(30.0),
+    limits=httpx.Limits(max_keepalive_connections=8),
+    trust_env=False,
+)
+
 class Reasoning:
     def __init__(self, model_name: str, context_str: str):
         self.model_name = model_name
         self.context_str = context_str  # Receive context directly here
-        self.api_url = settings.OLLAMA_API_URL
-        self.client = httpx.AsyncClient(timeout=httpx.Timeout(30.0))
+        self.client = _client
+
+    async def _chat(self, role: str, prompt: str) -> str:
+        response = await self.client.post(
+            "/api/chat",
+            json={"model": self.model_name, "messages": [{"role": role, "content": prompt}], "stream": False}
+        )
+        return response.json().get("message", {}).get("content", "")
 
     async def perform_chain_of_thought_reasoning(self, query: str):
         logger.debug(f"Starting reasoning for query: {query}")
 
+        # Each stage feeds the next, so the chain itself stays sequential;
+        # the shared client means only the first call pays connection setup.
+
         # Step 1: Generate initial response from LLM using query and context
         initial_response = await self.generate_initial_response(query)
 
@@ -49,39 +68,23 @@ class Reasoning:
     async def generate_initial_response(self, query: str):
         # Generate the LLM's initial response based on the context + query
         combined_prompt = f"Context: {self.context_str}\nUser query: {query}"
-        response = await self.client.post(
-            f"{self.api_url}/api/chat",
-            json={"model": self.model_name, "messages": [{"role": "user", "content": combined_prompt}], "stream": False}
-        )
-        return response.json().get("message", {}).get("content", "")
+        return await self._chat("user", combined_prompt)
 
     async def analyze_with_critic(self, initial_response: str):
         # Critic analyzes the initial response, considering context
         critic_prompt = f"Critic, analyze this response:\n{initial_response}\nContext: {self.context_str}"
-        response = await self.client.post(
-            f"{self.api_url}/api/chat",
-            json={"model": self.model_name, "messages": [{"role": "system", "content": critic_prompt}], "stream": False}
-        )
-        return response.json().get("message", {}).get("content", "")
+        return await self._chat("system", critic_prompt)
 
     async def respond_to_critic(self, critic_analysis: str):
         # Responder responds to Critic's analysis, incorporating context
         responder_prompt = f"Responder, reply to the Critic's analysis:\n{critic_analysis}\nContext: {self.context_str}"
-        response = await self.client.post(
-            f"{self.api_url}/api/chat",
-            json={"model": self.model_name, "messages": [{"role": "system", "content": responder_prompt}], "stream": False}
-        )
-        return response.json().get("message", {}).get("content", "")
+        return await self._chat("system", responder_prompt)
 
     async def generate_final_answer(self, critic_analysis: str, responder_response: str):
         # Generate the final answer based on Critic's and Responder's dialogues
         final_answer_prompt = f"Final answer based on the following:\nCritic: {critic_analysis}\nResponder: {responder_response}\nContext: {self.context_str}"
-        response = await self.client.post(
-            f"{self.api_url}/api/chat",
-            json={"model": self.model_name, "messages": [{"role": "system", "content": final_answer_prompt}], "stream": False}
-        )
-        return response.json().get("message", {}).get("content", "")
+        return await self._chat("system", final_answer_prompt)
 
     async def close(self):
-        await self.client.aclose()
-
+        # The client is shared at module scope and stays open for reuse.
+        pass
@@ -1,23 +1,45 @@
 import tiktoken
 import torch
+import numpy as np
+from functools import lru_cache
+from typing import List
+
+@lru_cache(maxsize=8)
+def _get_encoder(model_name: str):
+    # encoding_for_model parses the BPE vocabulary from disk; share one
+    # encoder per model across all wrapper instances.
+    return tiktoken.encoding_for_model(model_name)
 
 class TikTokenWrapper:
     """
     A simple wrapper for tiktoken to mimic a Hugging Face tokenizer interface.
-    
+
     This class provides an __call__ method for encoding text into token IDs
     and a decode method for converting token IDs back into text.
     """
     def __init__(self, model_name: str = "gpt-3.5-turbo"):
         # Load the tiktoken encoder for the specified model.
-        self.encoder = tiktoken.encoding_for_model(model_name)
+        self.encoder = _get_encoder(model_name)
+
+    def encode_ids(self, text: str) -> List[int]:
+        """Encode to a plain id list — the zero-tensor path for callers
+        that only count tokens."""
+        return self.encoder.encode(text)
+
+    def encode_batch(self, texts: List[str]) -> List[List[int]]:
+        """Encode many texts in one call; tiktoken parallelizes the batch
+        across Rust threads."""
+        return self.encoder.encode_batch(texts)
 
     def __call__(self, text: str, return_tensors: str = None):
         # Encode the text into token IDs.
         tokens = self.encoder.encode(text)
         if return_tensors == "pt":
-            # Return as a dictionary with a tensor (as expected by many models).
-            return {"input_ids": torch.tensor([tokens], dtype=torch.long)}
+            # from_numpy shares the numpy buffer, so the only copy is the
+            # one building the int64 array; unsqueeze_ adds the batch dim
+            # in place.
+            ids = torch.from_numpy(np.asarray(tokens, dtype=np.int64)).unsqueeze_(0)
+            return {"input_ids": ids}
         return tokens
 
     def decode(self, token_ids, skip_special_tokens: bool = True):
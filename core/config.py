@@ -1,8 +1,28 @@
 # core/config.py
 import os
+from functools import lru_cache
 from typing import Dict, Optional
 from pathlib import Path
 
+DEFAULT_CONTEXT_LENGTH = 4096
+_CONTEXT_LENGTHS: Dict[str, int] = {
+    "llama2": 4096,
+    "mistral": 8192,
+    "codellama": 16384,
+    "neural-chat": 8192,
+    "starling-lm": 8192
+}
+
+@lru_cache(maxsize=128)
+def _resolve_context_length(model_name: str) -> int:
+    """Resolve and cache the context length for a model tag.
+
+    ContextManager is constructed per request, so the split/lower/lookup
+    only runs once per distinct model string.
+    """
+    base_model = model_name.split(":")[0].lower()
+    return _CONTEXT_LENGTHS.get(base_model, DEFAULT_CONTEXT_LENGTH)
+
 class Settings:
     # Application settings
     APP_NAME: str = "Chat Application"
@@ -17,25 +37,26 @@ class Settings:
     
     # API settings
     OLLAMA_API_URL: str = "http://localhost:11434"
+    # Keep in sync with the value passed to `ollama serve --parallel`;
+    # excess chat requests queue in the API instead of thrashing the server.
+    OLLAMA_MAX_CONCURRENCY: int = 4
     
     # Model settings
-    DEFAULT_CONTEXT_LENGTH: int = 4096
-    MODEL_CONTEXT_LENGTHS: Dict[str, int] = {
-        "llama2": 4096,
-        "mistral": 8192,
-        "codellama": 16384,
-        "neural-chat": 8192,
-        "starling-lm": 8192
-    }
+    DEFAULT_CONTEXT_LENGTH: int = DEFAULT_CONTEXT_LENGTH
+    MODEL_CONTEXT_LENGTHS: Dict[str, int] = _CONTEXT_LENGTHS
     DEFAULT_MODEL: str = "granite3-dense:2b"
     INDEX_PATH = "context_index.bin"
     MEMORY_TEXTS_PATH = "context_texts.json"
 
+    # Embedding backend: "torch" (stock SentenceTransformer) or "onnx"
+    # (onnxruntime session over a pre-exported model, 2-4x faster on CPU).
+    EMBED_BACKEND: str = "torch"
+    EMBED_ONNX_PATH: str = "all-mpnet-base-v2.onnx"
+
     def __init__(self):
         os.makedirs(self.UPLOAD_DIR, exist_ok=True)
     
     def get_model_context_length(self, model_name: str) -> int:
-        base_model = model_name.split(":")[0].lower()
-        return self.MODEL_CONTEXT_LENGTHS.get(base_model, self.DEFAULT_CONTEXT_LENGTH)
+        return _resolve_context_length(model_name)
 
 settings = Settings()
\ No newline at end of file
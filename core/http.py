@@ -0,0 +1,22 @@
+# core/http.py
+import httpx
+from .config import settings
+
+# Single shared client for all Ollama calls. Reusing one connection pool
+# avoids a fresh TCP handshake and pool setup on every request. No
+# http2 flag: the base_url is cleartext http, where httpx never
+# negotiates HTTP/2 (ALPN needs TLS), and the flag would make client
+# construction require the optional h2 package for nothing.
+# trust_env=False skips the proxy-environment lookup httpx otherwise
+# performs per client — pointless overhead for a localhost hop.
+ollama_client = httpx.AsyncClient(
+    base_url=settings.OLLAMA_API_URL,
+    # Generous read window for long generations, but fail fast on
+    # connect — the hop is local, so a slow connect means Ollama is down.
+    timeout=httpx.Timeout(120.0, connect=2.0),
+    limits=httpx.Limits(max_connections=2000, max_keepalive_connections=500),
+    trust_env=False,
+)
+
+async def close_ollama_client() -> None:
+    await ollama_client.aclose()
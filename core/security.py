@@ -1,28 +1,71 @@
 # core/security.py
-from datetime import datetime, timedelta
-from typing import Optional, Union
+import base64
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
 import jwt
+import orjson
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from database.models import TokenData, User
 from .config import settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Successful decodes are cached briefly so the HMAC check and JSON parse
+# run once per token per window instead of on every authenticated
+# request. Keyed by a short token digest (the token itself is never
+# stored); failures are never cached. LRU-bounded like the embedding
+# cache in context.manager.
+_TOKEN_CACHE_MAX = 10000
+_TOKEN_CACHE_TTL = 30.0
+_token_cache: "OrderedDict[bytes, Tuple[str, float, float]]" = OrderedDict()
+
+# Built once: a fresh list per decode call is pointless allocation, and
+# requiring exp/sub inside the decode pass replaces the manual
+# presence checks that used to follow it.
+_ALGORITHMS = [settings.ALGORITHM]
+_DECODE_OPTIONS = {"require": ["exp", "sub"]}
+
+# Fixed-shape signing kernel for the default HS256 setup: the key bytes
+# and the canonical header segment never change, so issuance is one
+# orjson dump, two base64 encodes and one HMAC-SHA256 — no per-call
+# algorithm lookup or header serialization. The output is a standard
+# JWT; jwt.decode verifies it unchanged.
+_SECRET_KEY_BYTES = settings.SECRET_KEY.encode()
+_JWT_HEADER_B64 = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b"=")
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    to_encode["exp"] = int(time.time()) + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    if settings.ALGORITHM != "HS256":
+        return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    payload_b64 = base64.urlsafe_b64encode(orjson.dumps(to_encode)).rstrip(b"=")
+    signing_input = _JWT_HEADER_B64 + b"." + payload_b64
+    signature = hmac.new(_SECRET_KEY_BYTES, signing_input, hashlib.sha256).digest()
+    return (signing_input + b"." + base64.urlsafe_b64encode(signature).rstrip(b"=")).decode()
 
 def verify_token(token: str) -> Optional[str]:
+    key = hashlib.sha256(token.encode()).digest()[:16]
+    now = time.time()
+    hit = _token_cache.get(key)
+    if hit is not None:
+        username, exp, cached_at = hit
+        if now - cached_at < _TOKEN_CACHE_TTL and now < exp:
+            _token_cache.move_to_end(key)
+            return username
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
+        payload = jwt.decode(
+            token, settings.SECRET_KEY, algorithms=_ALGORITHMS, options=_DECODE_OPTIONS
+        )
+        username: str = payload["sub"]
         if username is None:
             return None
-        token_data = TokenData(username=username)
-        return token_data.username
+        _token_cache[key] = (username, float(payload["exp"]), now)
+        if len(_token_cache) > _TOKEN_CACHE_MAX:
+            _token_cache.popitem(last=False)
+        return username
     except jwt.PyJWTError:
         return None
 
@@ -1,35 +1,140 @@
 # database/manager.py
 import sqlite3
 import hashlib
+import hmac
 import os
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
 from typing import Optional, List, Dict, Any, Tuple
 import logging
-import httpx
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from core.config import settings
+from core.http import ollama_client
 from context.manager import ContextManager
 
 logger = logging.getLogger(__name__)
 
+# Applied to every connection once at open. WAL lets readers run
+# alongside the writer, synchronous=NORMAL drops the per-commit fsync
+# WAL no longer needs, and the cache/mmap settings keep hot pages in
+# memory across queries instead of re-reading them per connection.
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+)
+
+# Successful/failed verifications are cached briefly so repeated logins
+# with the same credentials skip the deliberately slow 100k-iteration
+# KDF; cold logins still pay it in full.
+_AUTH_CACHE_TTL = 300
+_AUTH_CACHE_MAX = 1024
+
+# INSERT ... RETURNING hands back the new rowid in the same statement,
+# skipping the separate last_insert_rowid C-API call; needs SQLite 3.35+.
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
 class DatabaseManager:
     def __init__(self):
         self.db_path = settings.DATABASE_PATH
-        self.embedding_client = httpx.AsyncClient()
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._write_conn = self._open_connection()
+        self._auth_cache: Dict[Tuple[str, bytes], Tuple[bool, float]] = {}
+        self._auth_cache_lock = threading.Lock()
+        # Chats whose title is known to be final; a chat's title is
+        # generated exactly once, so members can short-circuit
+        # update_chat_title without any DB or LLM work. Only touched from
+        # the event loop, so no lock is needed.
+        self._title_generated: set = set()
+        # Usernames confirmed to exist; see _user_exists.
+        self._known_users: set = set()
+        # Title-generation jobs are funneled through an optional queue so
+        # bursts of new chats share one draining task (see _title_worker);
+        # created lazily because no event loop exists at construction.
+        self._title_queue: Optional[asyncio.Queue] = None
+        self._title_task: Optional[asyncio.Task] = None
+        # Message writes from the chat endpoints go through this bounded
+        # queue so SSE responses can close without waiting on the commit.
+        # A single drainer keeps per-chat insertion order (sqlite has one
+        # writer anyway, so more workers would only reorder). Lazy like
+        # the title queue.
+        self._message_queue: Optional[asyncio.Queue] = None
+        self._message_task: Optional[asyncio.Task] = None
         self._init_db()
 
-    def _get_connection(self) -> sqlite3.Connection:
-        return sqlite3.connect(self.db_path)
+    def _open_connection(self, read_only: bool = False) -> sqlite3.Connection:
+        # cached_statements raises the per-connection prepared-statement
+        # cache above the number of distinct queries in this class, so
+        # repeat calls hit sqlite3's cache instead of re-running
+        # sqlite3_prepare_v2. The cache keys on SQL string equality and
+        # every query here is a fixed literal (no f-strings), so hits
+        # saturate without hoisting the SQL to constants.
+        conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, cached_statements=256
+        )
+        # Row supports dict-style access without per-row Python zip/dict
+        # loops; dict(row) converts at C level where a dict is needed.
+        conn.row_factory = sqlite3.Row
+        for pragma in _PRAGMAS:
+            conn.execute(pragma)
+        if read_only:
+            conn.execute("PRAGMA query_only=1")
+        return conn
+
+    @contextmanager
+    def _get_writer(self):
+        """Yield the single write connection under the write lock.
+
+        WAL allows exactly one writer at a time; funneling all writes
+        through one dedicated connection makes contention a cheap Python
+        lock wait instead of SQLITE_BUSY retries."""
+        with self._write_lock:
+            yield self._write_conn
+
+    def _get_reader(self) -> sqlite3.Connection:
+        """Return this thread's read-only connection, opened on first use.
+
+        Readers never block each other (or the writer) in WAL mode, so
+        SELECT-heavy endpoints scale with the worker thread count while
+        reusing each thread's warm page cache."""
+        conn = getattr(self._local, "reader", None)
+        if conn is None:
+            conn = self._open_connection(read_only=True)
+            self._local.reader = conn
+        return conn
 
     def _init_db(self) -> None:
-        with self._get_connection() as conn:
+        with self._get_writer() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS users (
                     username TEXT PRIMARY KEY,
-                    password_hash TEXT NOT NULL,
-                    salt TEXT NOT NULL
+                    password_hash BLOB NOT NULL,
+                    salt BLOB NOT NULL
                 )
             ''')
+
+            # One-shot migration from the old hex-TEXT storage. The hash
+            # becomes its raw bytes; the salt keeps its exact byte
+            # sequence (the hex string's ASCII) because that is what the
+            # KDF was originally fed, so existing passwords still verify.
+            cursor.execute(
+                "SELECT username, password_hash, salt FROM users WHERE typeof(password_hash) = 'text'"
+            )
+            for row in cursor.fetchall():
+                cursor.execute(
+                    "UPDATE users SET password_hash = ?, salt = ? WHERE username = ?",
+                    (bytes.fromhex(row["password_hash"]), row["salt"].encode('ascii'), row["username"])
+                )
             
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS chats (
@@ -39,9 +144,16 @@ class DatabaseManager:
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     model TEXT NOT NULL,
                     system_prompt TEXT,
+                    window_start INTEGER NOT NULL DEFAULT 0,
                     FOREIGN KEY (username) REFERENCES users(username)
                 )
             ''')
+
+            # Migration for databases created before the window_start column.
+            try:
+                cursor.execute("ALTER TABLE chats ADD COLUMN window_start INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass
             
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS messages (
@@ -50,7 +162,7 @@ class DatabaseManager:
                     role TEXT NOT NULL,
                     content TEXT NOT NULL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (chat_id) REFERENCES chats(id)
+                    FOREIGN KEY (chat_id) REFERENCES chats(id) ON DELETE CASCADE
                 )
             ''')
             
@@ -64,55 +176,231 @@ class DatabaseManager:
                     FOREIGN KEY (username) REFERENCES users(username)
                 )
             ''')
-            
+
+            # Composite indexes for the hot filters: message fetches and
+            # update_message order by (chat_id, created_at), the chat list
+            # orders by (username, created_at DESC), and ownership checks
+            # probe (username, id). Without these the tables full-scan.
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_messages_chat_time ON messages(chat_id, created_at)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_chats_user_time ON chats(username, created_at DESC)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_chats_user_id ON chats(username, id)"
+            )
+
             conn.commit()
 
-    def create_chat(self, username: str, title: Optional[str], model: str, system_prompt: Optional[str] = None) -> int:
+    def _create_chat(self, username: str, title: Optional[str], model: str, system_prompt: Optional[str] = None) -> int:
         """Create a new chat for the given user."""
         if not title:
             title = "New Chat..."
             
-        with self._get_connection() as conn:
+        with self._get_writer() as conn:
+            cursor = conn.cursor()
+            if _HAS_RETURNING:
+                cursor.execute(
+                    """INSERT INTO chats (username, title, model, system_prompt)
+                    VALUES (?, ?, ?, ?) RETURNING id""",
+                    (username, title, model, system_prompt)
+                )
+                chat_id = cursor.fetchone()[0]
+            else:
+                cursor.execute(
+                    """INSERT INTO chats (username, title, model, system_prompt)
+                    VALUES (?, ?, ?, ?)""",
+                    (username, title, model, system_prompt)
+                )
+                chat_id = cursor.lastrowid
+            conn.commit()
+            return chat_id
+
+    def _remember_title_generated(self, chat_id: int) -> None:
+        if len(self._title_generated) >= 10000:
+            self._title_generated.clear()
+        self._title_generated.add(chat_id)
+
+    def _create_chat_with_message(self, username: str, title: Optional[str], model: str,
+                                  system_prompt: Optional[str], role: str, content: str) -> int:
+        """Create a chat and its first message in one transaction.
+
+        The send-message path otherwise runs two implicit transactions —
+        two fsyncs — back to back; BEGIN IMMEDIATE takes the write lock
+        up front so both INSERTs and the single commit are atomic."""
+        if not title:
+            title = "New Chat..."
+        with self._get_writer() as conn:
             cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            if _HAS_RETURNING:
+                cursor.execute(
+                    """INSERT INTO chats (username, title, model, system_prompt)
+                    VALUES (?, ?, ?, ?) RETURNING id""",
+                    (username, title, model, system_prompt)
+                )
+                chat_id = cursor.fetchone()[0]
+            else:
+                cursor.execute(
+                    """INSERT INTO chats (username, title, model, system_prompt)
+                    VALUES (?, ?, ?, ?)""",
+                    (username, title, model, system_prompt)
+                )
+                chat_id = cursor.lastrowid
             cursor.execute(
-                """INSERT INTO chats (username, title, model, system_prompt)
-                VALUES (?, ?, ?, ?)""",
-                (username, title, model, system_prompt)
+                """INSERT INTO messages (chat_id, role, content)
+                VALUES (?, ?, ?)""",
+                (chat_id, role, content)
             )
-            chat_id = cursor.lastrowid
             conn.commit()
             return chat_id
 
-    async def update_chat_title(self, chat_id: int, model: str) -> None:
-        with self._get_connection() as conn:
+    def _fetch_title_and_first_message(self, chat_id: int):
+        # Title and first message in one round trip; the subquery rides the
+        # (chat_id, created_at) index.
+        with self._get_reader() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT title FROM chats WHERE id = ?", (chat_id,))
-            row = cursor.fetchone()
-            if not row or row[0] != "New Chat...":
-                return
-
             cursor.execute(
-                "SELECT content FROM messages WHERE chat_id = ? ORDER BY created_at ASC LIMIT 1",
+                """SELECT c.title,
+                       (SELECT content FROM messages
+                        WHERE chat_id = c.id
+                        ORDER BY created_at ASC LIMIT 1) AS first_msg
+                FROM chats c WHERE c.id = ?""",
                 (chat_id,)
             )
-            first_message = cursor.fetchone()
-            if not first_message:
-                return
+            return cursor.fetchone()
+
+    def _set_generated_title(self, chat_id: int, title: str) -> None:
+        with self._get_writer() as conn:
+            cursor = conn.cursor()
+            # Compare-and-swap on the placeholder so concurrent title
+            # updates for the same chat don't overwrite a title another
+            # request already generated.
+            cursor.execute(
+                "UPDATE chats SET title = ? WHERE id = ? AND title = 'New Chat...'",
+                (title, chat_id)
+            )
+            conn.commit()
 
-        # Initialize the context manager for this model
-        context_manager = ContextManager(chat_id=chat_id, model=model)
-        first_message_text = first_message[0].strip()
+    async def start_title_worker(self) -> None:
+        """Start the coalescing title-generation worker (app startup)."""
+        if self._title_task is None:
+            self._title_queue = asyncio.Queue()
+            self._title_task = asyncio.create_task(self._title_worker())
 
-        # Estimate tokens for the first message
-        estimated_tokens = context_manager._estimate_tokens(
-            [{"role": "user", "content": first_message_text}]
-        )
+    async def stop_title_worker(self) -> None:
+        """Cancel the title worker (app shutdown)."""
+        if self._title_task is not None:
+            self._title_task.cancel()
+            self._title_task = None
+            self._title_queue = None
+
+    async def start_message_worker(self) -> None:
+        """Start the background message-write drainer (app startup)."""
+        if self._message_task is None:
+            self._message_queue = asyncio.Queue(maxsize=1000)
+            self._message_task = asyncio.create_task(self._message_worker())
+
+    async def stop_message_worker(self) -> None:
+        """Flush queued writes, then cancel the drainer (app shutdown)."""
+        if self._message_task is not None:
+            await self._message_queue.join()
+            self._message_task.cancel()
+            self._message_task = None
+            self._message_queue = None
+
+    async def _message_worker(self) -> None:
+        """Drain enqueued message writes one at a time, in FIFO order."""
+        while True:
+            chat_id, role, content = await self._message_queue.get()
+            try:
+                await asyncio.to_thread(self._save_message, chat_id, role, content)
+            except Exception:
+                logger.exception("Background save_message failed for chat %s", chat_id)
+            finally:
+                self._message_queue.task_done()
+
+    async def enqueue_message(self, chat_id: int, role: str, content: str) -> None:
+        """Persist a message off the response path when the worker runs.
+
+        Falls back to an inline save when no worker has been started
+        (scripts, tests), so callers never need to care which mode the
+        process is in.
+        """
+        if self._message_queue is not None:
+            await self._message_queue.put((chat_id, role, content))
+            return
+        await self.save_message(chat_id, role, content)
+
+    async def _title_worker(self) -> None:
+        """Drain queued title jobs in small batches.
+
+        Waiting ~50ms after the first job lets a burst of new chats
+        coalesce, then the batch runs concurrently through the shared
+        pooled client instead of N sequential POSTs to Ollama.
+        """
+        while True:
+            batch = [await self._title_queue.get()]
+            await asyncio.sleep(0.05)
+            while len(batch) < 8:
+                try:
+                    batch.append(self._title_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            results = await asyncio.gather(
+                *(self._generate_chat_title(chat_id, model) for chat_id, model in batch),
+                return_exceptions=True,
+            )
+            # return_exceptions keeps one bad job from killing the worker,
+            # but the exceptions still have to be surfaced — otherwise a
+            # failed DB fetch or ContextManager init vanishes and the chat
+            # silently keeps its placeholder title.
+            for (chat_id, _), result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    logger.error(
+                        "Title generation failed for chat %s", chat_id, exc_info=result
+                    )
+
+    async def update_chat_title(self, chat_id: int, model: str) -> None:
+        if chat_id in self._title_generated:
+            return
+        if self._title_queue is not None:
+            await self._title_queue.put((chat_id, model))
+            return
+        await self._generate_chat_title(chat_id, model)
+
+    async def _generate_chat_title(self, chat_id: int, model: str) -> None:
+        row = await asyncio.to_thread(self._fetch_title_and_first_message, chat_id)
+        if not row or row[1] is None:
+            return
+        if row[0] != "New Chat...":
+            self._remember_title_generated(chat_id)
+            return
+
+        # Initialize the context manager for this model. The constructor
+        # loads the chat's memory and index from disk — and on a cold
+        # process the embedder itself — so it runs in a worker thread
+        # like the other ContextManager constructions; the token count
+        # rides along.
+        first_message_text = row[1].strip()
+
+        def _build_manager():
+            manager = ContextManager(chat_id=chat_id, model=model)
+            tokens = manager._estimate_tokens(
+                [{"role": "user", "content": first_message_text}]
+            )
+            return manager, tokens
+
+        context_manager, estimated_tokens = await asyncio.to_thread(_build_manager)
         # Define a threshold (here, we use half the model's max context length)
         threshold = context_manager.max_context_length // 2
 
-        # If the message is too long, summarize it before generating the title
+        # If the message is too long, summarize it before generating the title.
+        # summarize_context does blocking HTTP, so it runs in a worker thread.
         if estimated_tokens > threshold:
-            summarized_text = context_manager.summarize_context(
+            summarized_text = await asyncio.to_thread(
+                context_manager.summarize_context,
                 [{"role": "user", "content": first_message_text}]
             )
             content_for_prompt = summarized_text
@@ -125,44 +413,41 @@ class DatabaseManager:
         )
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{settings.OLLAMA_API_URL}/api/generate",
-                    json={
-                        "model": model,
-                        "prompt": prompt,
-                        "stream": False
-                    }
-                )
-                if response.status_code == 200:
-                    data = response.json()
-                    generated_title = data.get("response", "").strip()
-                    generated_title = generated_title.split("\n")[0].strip()
-
-                    # Remove surrounding quotes if present
-                    if (generated_title.startswith('"') and generated_title.endswith('"')) or \
-                    (generated_title.startswith("'") and generated_title.endswith("'")):
-                        generated_title = generated_title[1:-1].strip()
-
-                    if not generated_title:
-                        generated_title = first_message_text
-                    max_length = 60
-                    if len(generated_title) > max_length:
-                        generated_title = generated_title[:max_length].rstrip() + "..."
-
-                    with self._get_connection() as conn:
-                        cursor = conn.cursor()
-                        cursor.execute(
-                            "UPDATE chats SET title = ? WHERE id = ?",
-                            (generated_title, chat_id)
-                        )
-                        conn.commit()
+            # The shared pooled client (closed by the app lifespan) keeps
+            # the connection to Ollama alive across title generations
+            # instead of paying TCP setup per call.
+            response = await ollama_client.post(
+                "/api/generate",
+                json={
+                    "model": model,
+                    "prompt": prompt,
+                    "stream": False
+                }
+            )
+            if response.status_code == 200:
+                data = response.json()
+                generated_title = data.get("response", "").strip()
+                generated_title = generated_title.split("\n")[0].strip()
+
+                # Remove surrounding quotes if present
+                if (generated_title.startswith('"') and generated_title.endswith('"')) or \
+                (generated_title.startswith("'") and generated_title.endswith("'")):
+                    generated_title = generated_title[1:-1].strip()
+
+                if not generated_title:
+                    generated_title = first_message_text
+                max_length = 60
+                if len(generated_title) > max_length:
+                    generated_title = generated_title[:max_length].rstrip() + "..."
+
+                await asyncio.to_thread(self._set_generated_title, chat_id, generated_title)
+                self._remember_title_generated(chat_id)
         except Exception as e:
             logger.error(f"Error updating chat title: {e}")
 
-    def update_chat_model(self, chat_id: int, model: str) -> None:
+    def _update_chat_model(self, chat_id: int, model: str) -> None:
         """Update the model associated with a chat."""
-        with self._get_connection() as conn:
+        with self._get_writer() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 "UPDATE chats SET model = ? WHERE id = ?",
@@ -170,10 +455,10 @@ class DatabaseManager:
             )
             conn.commit()
 
-    def rename_chat(self, chat_id: int, new_title: str) -> bool:
+    def _rename_chat(self, chat_id: int, new_title: str) -> bool:
         """Rename an existing chat."""
         try:
-            with self._get_connection() as conn:
+            with self._get_writer() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     "UPDATE chats SET title = ? WHERE id = ?",
@@ -185,34 +470,55 @@ class DatabaseManager:
             logger.error(f"Error renaming chat: {e}")
             return False
 
-    def _hash_password(self, password: str, salt: Optional[str] = None) -> Tuple[str, str]:
+    def _hash_password(self, password: str, salt: Optional[bytes] = None) -> Tuple[bytes, bytes]:
+        # PBKDF2 through cryptography's OpenSSL 3 binding, which uses the
+        # CPU's SHA extensions where available; iteration count and the
+        # 32-byte output match the original hashlib.pbkdf2_hmac call.
+        # Hash and salt stay raw bytes end to end — sqlite3 maps bytes to
+        # BLOB natively, halving what the old hex TEXT encoding stored
+        # and copied on every auth query.
         if salt is None:
-            salt = os.urandom(16).hex()
-        password_hash = hashlib.pbkdf2_hmac(
-            'sha256',
-            password.encode('utf-8'),
-            salt.encode('utf-8'),
-            100000
-        ).hex()
-        return password_hash, salt
-
-    def create_user(self, username: str, password: str) -> bool:
+            salt = os.urandom(16)
+        kdf = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=salt,
+            iterations=100000,
+        )
+        return kdf.derive(password.encode('utf-8')), salt
+
+    def _create_user(self, username: str, password: str) -> bool:
         password_hash, salt = self._hash_password(password)
         try:
-            with self._get_connection() as conn:
+            with self._get_writer() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     "INSERT INTO users (username, password_hash, salt) VALUES (?, ?, ?)",
                     (username, password_hash, salt)
                 )
                 conn.commit()
-                return True
+            # Drop any cached verdicts for this username so the new
+            # credentials take effect immediately.
+            with self._auth_cache_lock:
+                self._auth_cache = {
+                    k: v for k, v in self._auth_cache.items() if k[0] != username
+                }
+            return True
         except sqlite3.IntegrityError:
             logger.warning(f"Attempted to create duplicate user: {username}")
             return False
 
-    def verify_user(self, username: str, password: str) -> bool:
-        with self._get_connection() as conn:
+    def _verify_user(self, username: str, password: str) -> bool:
+        # Key on a fast SHA-256 of the password (not the KDF) so cache
+        # lookups are O(1); the plaintext is never stored.
+        cache_key = (username, hashlib.sha256(password.encode('utf-8')).digest())
+        now = time.monotonic()
+        with self._auth_cache_lock:
+            hit = self._auth_cache.get(cache_key)
+            if hit is not None and now - hit[1] < _AUTH_CACHE_TTL:
+                return hit[0]
+
+        with self._get_reader() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 "SELECT password_hash, salt FROM users WHERE username = ?",
@@ -223,10 +529,16 @@ class DatabaseManager:
                 return False
             stored_hash, salt = result
             password_hash = self._hash_password(password, salt)[0]
-            return password_hash == stored_hash
+            verified = hmac.compare_digest(password_hash, stored_hash)
+
+        with self._auth_cache_lock:
+            if len(self._auth_cache) >= _AUTH_CACHE_MAX:
+                self._auth_cache.clear()
+            self._auth_cache[cache_key] = (verified, now)
+        return verified
 
-    def get_user_chats(self, username: str) -> List[Dict[str, Any]]:
-        with self._get_connection() as conn:
+    def _get_user_chats(self, username: str) -> List[Dict[str, Any]]:
+        with self._get_reader() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """SELECT id, title, created_at, model 
@@ -235,11 +547,10 @@ class DatabaseManager:
                 ORDER BY created_at DESC""",
                 (username,)
             )
-            columns = ['id', 'title', 'created_at', 'model']
-            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            return [dict(row) for row in cursor.fetchall()]
 
-    def get_chat_messages(self, chat_id: int) -> List[Dict[str, str]]:
-        with self._get_connection() as conn:
+    def _get_chat_messages(self, chat_id: int) -> List[Dict[str, str]]:
+        with self._get_reader() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """SELECT role, content, created_at 
@@ -248,11 +559,10 @@ class DatabaseManager:
                 ORDER BY created_at""",
                 (chat_id,)
             )
-            columns = ['role', 'content', 'created_at']
-            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            return [dict(row) for row in cursor.fetchall()]
 
-    def get_chat_details(self, chat_id: int) -> Optional[Dict[str, Any]]:
-        with self._get_connection() as conn:
+    def _get_chat_details(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        with self._get_reader() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """SELECT title, model, system_prompt, username 
@@ -261,55 +571,169 @@ class DatabaseManager:
                 (chat_id,)
             )
             result = cursor.fetchone()
-            if result:
-                return {
-                    "title": result[0],
-                    "model": result[1],
-                    "system_prompt": result[2],
-                    "username": result[3]
-                }
-            return None
+            return dict(result) if result else None
 
-    def verify_chat_ownership(self, chat_id: int, username: str) -> bool:
-        with self._get_connection() as conn:
+    def _get_chat_details_for_user(self, chat_id: int, username: str) -> Optional[Dict[str, Any]]:
+        """Fetch chat details with the ownership check folded into the query.
+
+        Returns None whether the chat is missing or owned by someone else,
+        so callers need one round trip instead of a verify + fetch pair.
+        """
+        with self._get_reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """SELECT title, model, system_prompt, username
+                FROM chats
+                WHERE id = ? AND username = ?""",
+                (chat_id, username)
+            )
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def _get_chat_bundle(self, chat_id: int, username: str, window_size: Optional[int] = None, include_preferences: bool = True) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, str]], Tuple[Optional[str], str, Optional[str], bool]]:
+        """Fetch chat details, messages and user preferences in one connection.
+
+        The ownership check is folded into the details query: if the chat does
+        not exist or belongs to another user, details is None and the other
+        results are defaults. This replaces four separate round-trips on the
+        send-message hot path.
+
+        When window_size is given, messages are read from the chat's
+        append-only window: fetching starts at the persisted window_start,
+        and the window only rotates forward (by window_size at a time) once
+        it exceeds 2 * window_size messages. Consecutive requests therefore
+        send an identical prompt prefix that the model server can keep in
+        its prompt cache instead of re-encoding every turn.
+        """
+        with self._get_reader() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                "SELECT 1 FROM chats WHERE id = ? AND username = ?",
+                """SELECT title, model, system_prompt, username, window_start
+                FROM chats
+                WHERE id = ? AND username = ?""",
                 (chat_id, username)
             )
-            return cursor.fetchone() is not None
+            row = cursor.fetchone()
+            if not row:
+                return None, [], (None, 'light', None, True)
+            details = {
+                "title": row["title"],
+                "model": row["model"],
+                "system_prompt": row["system_prompt"],
+                "username": row["username"]
+            }
+            window_start = row["window_start"] or 0
+            offset = window_start if window_size else 0
+            # Project only role and content: the rows already have the
+            # exact shape the chat endpoints forward to Ollama, so no
+            # caller needs a per-request reshaping pass. The sort still
+            # rides the (chat_id, created_at) covering index.
+            cursor.execute(
+                """SELECT role, content
+                FROM messages
+                WHERE chat_id = ?
+                ORDER BY created_at
+                LIMIT -1 OFFSET ?""",
+                (chat_id, offset)
+            )
+            messages = [dict(r) for r in cursor.fetchall()]
+            if window_size and len(messages) > 2 * window_size:
+                # Deferred truncation: advance the window in whole
+                # window_size steps so the prefix stays stable in between.
+                steps = (len(messages) - window_size - 1) // window_size
+                advance = steps * window_size
+                messages = messages[advance:]
+                # The occasional window advance is the one write on this
+                # path; it goes through the dedicated writer.
+                with self._get_writer() as write_conn:
+                    write_conn.execute(
+                        "UPDATE chats SET window_start = ? WHERE id = ?",
+                        (window_start + advance, chat_id)
+                    )
+                    write_conn.commit()
+            preferences = (None, 'light', None, True)
+            # Callers that only need details + messages (regenerate) skip
+            # the preferences lookup entirely.
+            if include_preferences:
+                cursor.execute(
+                    """SELECT default_model, theme, default_system_prompt, use_reasoning
+                    FROM user_preferences
+                    WHERE username = ?""",
+                    (username,)
+                )
+                pref_row = cursor.fetchone()
+                if pref_row:
+                    preferences = (pref_row[0], pref_row[1], pref_row[2], bool(pref_row[3]))
+            return details, messages, preferences
 
-    def save_message(self, chat_id: int, role: str, content: str) -> None:
-        with self._get_connection() as conn:
+    def _verify_chat_ownership(self, chat_id: int, username: str) -> bool:
+        with self._get_reader() as conn:
             cursor = conn.cursor()
+            # EXISTS collapses to a single index probe on (username, id)
+            # and always returns exactly one boolean row.
             cursor.execute(
-                """INSERT INTO messages (chat_id, role, content) 
+                "SELECT EXISTS(SELECT 1 FROM chats WHERE id = ? AND username = ?)",
+                (chat_id, username)
+            )
+            return bool(cursor.fetchone()[0])
+
+    def _save_messages(self, chat_id: int, messages: List[Tuple[str, str]]) -> None:
+        """Insert several (role, content) rows in one transaction.
+
+        executemany reuses the prepared INSERT for every row and the
+        single commit means one fsync for the whole batch instead of one
+        per message."""
+        with self._get_writer() as conn:
+            conn.executemany(
+                """INSERT INTO messages (chat_id, role, content)
                 VALUES (?, ?, ?)""",
-                (chat_id, role, content)
+                [(chat_id, role, content) for role, content in messages]
             )
             conn.commit()
 
-    def update_message(self, chat_id: int, message_index: int, new_content: str) -> None:
-        with self._get_connection() as conn:
+    def _save_message(self, chat_id: int, role: str, content: str) -> int:
+        """Insert one message and return its id, so callers that need to
+        reference the row later don't have to re-find it by offset."""
+        with self._get_writer() as conn:
+            cursor = conn.cursor()
+            if _HAS_RETURNING:
+                cursor.execute(
+                    """INSERT INTO messages (chat_id, role, content)
+                    VALUES (?, ?, ?) RETURNING id""",
+                    (chat_id, role, content)
+                )
+                message_id = cursor.fetchone()[0]
+            else:
+                cursor.execute(
+                    """INSERT INTO messages (chat_id, role, content)
+                    VALUES (?, ?, ?)""",
+                    (chat_id, role, content)
+                )
+                message_id = cursor.lastrowid
+            conn.commit()
+            return message_id
+
+    def _update_message(self, chat_id: int, message_index: int, new_content: str) -> None:
+        with self._get_writer() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """UPDATE messages 
                 SET content = ? 
                 WHERE chat_id = ? 
                 AND id = (
-                    SELECT id FROM messages 
-                    WHERE chat_id = ? 
-                    ORDER BY created_at 
+                    SELECT id FROM messages
+                    WHERE chat_id = ?
+                    ORDER BY created_at, id
                     LIMIT 1 OFFSET ?
                 )""",
                 (new_content, chat_id, chat_id, message_index)
             )
             conn.commit()
 
-    def set_user_preferences(self, username: str, default_model: Optional[str] = None,
+    def _set_user_preferences(self, username: str, default_model: Optional[str] = None,
                             theme: Optional[str] = None, default_system_prompt: Optional[str] = None,
                             use_reasoning: Optional[bool] = True) -> None:
-        with self._get_connection() as conn:
+        with self._get_writer() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """INSERT INTO user_preferences (username, default_model, theme, default_system_prompt, use_reasoning)
@@ -325,8 +749,8 @@ class DatabaseManager:
             )
             conn.commit()
 
-    def get_user_preferences(self, username: str) -> Tuple[Optional[str], str, Optional[str], bool]:
-        with self._get_connection() as conn:
+    def _get_user_preferences(self, username: str) -> Tuple[Optional[str], str, Optional[str], bool]:
+        with self._get_reader() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """SELECT default_model, theme, default_system_prompt, use_reasoning 
@@ -340,15 +764,99 @@ class DatabaseManager:
                 return (result[0], result[1], result[2], bool(result[3]))
             return (None, 'light', None, True)
 
-    def delete_chat(self, chat_id: int) -> None:
-        with self._get_connection() as conn:
+    def _delete_chat(self, chat_id: int) -> None:
+        with self._get_writer() as conn:
             cursor = conn.cursor()
+            # On databases created with the cascade DDL this first DELETE
+            # is a no-op (the chat delete cascades); it stays because
+            # SQLite can't ALTER an existing FK to add ON DELETE CASCADE,
+            # so older databases still need the explicit child delete.
             cursor.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
             cursor.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
             conn.commit()
 
-    def user_exists(self, username: str) -> bool:
-        with self._get_connection() as conn:
+    def _user_exists(self, username: str) -> bool:
+        # Existing users never stop existing, so positive results are
+        # memoized; negatives are re-checked since the user may have just
+        # registered.
+        if username in self._known_users:
+            return True
+        with self._get_reader() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT 1 FROM users WHERE username = ?", (username,))
-            return cursor.fetchone() is not None
\ No newline at end of file
+            cursor.execute(
+                "SELECT EXISTS(SELECT 1 FROM users WHERE username = ?)", (username,)
+            )
+            exists = bool(cursor.fetchone()[0])
+        if exists:
+            if len(self._known_users) >= 10000:
+                self._known_users.clear()
+            self._known_users.add(username)
+        return exists
+
+    # --- Async interface ------------------------------------------------
+    # The sqlite3 module is synchronous; running queries directly inside
+    # async handlers would block the event loop. These wrappers offload the
+    # sync implementations above to a worker thread so handlers can await
+    # them while the loop keeps serving other requests.
+
+    async def create_chat(self, username: str, title: Optional[str], model: str, system_prompt: Optional[str] = None) -> int:
+        return await asyncio.to_thread(self._create_chat, username, title, model, system_prompt)
+
+    async def create_chat_with_message(self, username: str, title: Optional[str], model: str,
+                                       system_prompt: Optional[str], role: str, content: str) -> int:
+        return await asyncio.to_thread(self._create_chat_with_message, username, title, model,
+                                       system_prompt, role, content)
+
+    async def update_chat_model(self, chat_id: int, model: str) -> None:
+        await asyncio.to_thread(self._update_chat_model, chat_id, model)
+
+    async def rename_chat(self, chat_id: int, new_title: str) -> bool:
+        return await asyncio.to_thread(self._rename_chat, chat_id, new_title)
+
+    async def create_user(self, username: str, password: str) -> bool:
+        return await asyncio.to_thread(self._create_user, username, password)
+
+    async def verify_user(self, username: str, password: str) -> bool:
+        return await asyncio.to_thread(self._verify_user, username, password)
+
+    async def get_user_chats(self, username: str) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get_user_chats, username)
+
+    async def get_chat_messages(self, chat_id: int) -> List[Dict[str, str]]:
+        return await asyncio.to_thread(self._get_chat_messages, chat_id)
+
+    async def get_chat_details(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get_chat_details, chat_id)
+
+    async def get_chat_details_for_user(self, chat_id: int, username: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get_chat_details_for_user, chat_id, username)
+
+    async def get_chat_bundle(self, chat_id: int, username: str, window_size: Optional[int] = None, include_preferences: bool = True) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, str]], Tuple[Optional[str], str, Optional[str], bool]]:
+        return await asyncio.to_thread(self._get_chat_bundle, chat_id, username, window_size, include_preferences)
+
+    async def verify_chat_ownership(self, chat_id: int, username: str) -> bool:
+        return await asyncio.to_thread(self._verify_chat_ownership, chat_id, username)
+
+    async def save_message(self, chat_id: int, role: str, content: str) -> int:
+        return await asyncio.to_thread(self._save_message, chat_id, role, content)
+
+    async def save_messages(self, chat_id: int, messages: List[Tuple[str, str]]) -> None:
+        await asyncio.to_thread(self._save_messages, chat_id, messages)
+
+    async def update_message(self, chat_id: int, message_index: int, new_content: str) -> None:
+        await asyncio.to_thread(self._update_message, chat_id, message_index, new_content)
+
+    async def set_user_preferences(self, username: str, default_model: Optional[str] = None,
+                                   theme: Optional[str] = None, default_system_prompt: Optional[str] = None,
+                                   use_reasoning: Optional[bool] = True) -> None:
+        await asyncio.to_thread(self._set_user_preferences, username, default_model, theme,
+                                default_system_prompt, use_reasoning)
+
+    async def get_user_preferences(self, username: str) -> Tuple[Optional[str], str, Optional[str], bool]:
+        return await asyncio.to_thread(self._get_user_preferences, username)
+
+    async def delete_chat(self, chat_id: int) -> None:
+        await asyncio.to_thread(self._delete_chat, chat_id)
+
+    async def user_exists(self, username: str) -> bool:
+        return await asyncio.to_thread(self._user_exists, username)
@@ -1,7 +1,12 @@
 # database/models.py
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List, Dict
-from datetime import datetime
+from datetime import datetime, timezone
+
+# Bound once: datetime.utcnow is deprecated (3.12+) and naive; this is a
+# single callable lookup per default instead of a method resolution.
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
 
 class UserBase(BaseModel):
     username: str
@@ -10,10 +15,9 @@ class UserCreate(UserBase):
     password: str
 
 class User(UserBase):
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=_utc_now)
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class TokenData(BaseModel):
     username: Optional[str] = None
@@ -30,10 +34,9 @@ class ChatBase(BaseModel):
 class Chat(ChatBase):
     id: int
     username: str
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=_utc_now)
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class MessageBase(BaseModel):
     role: str
@@ -45,10 +48,9 @@ class MessageCreate(MessageBase):
 class Message(MessageBase):
     id: int
     chat_id: int
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=_utc_now)
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class UserPreferences(BaseModel):
     default_model: Optional[str] = None
@@ -56,8 +58,7 @@ class UserPreferences(BaseModel):
     default_system_prompt: Optional[str] = None
     use_reasoning: bool = True
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ChatRequest(BaseModel):
     message: str
@@ -69,4 +70,4 @@ class ChatResponse(BaseModel):
     chat_id: int
 
 class ChatRename(BaseModel):
-    title: str
\ No newline at end of file
+    title: str
@@ -1,13 +1,57 @@
 # main.py
-from fastapi import FastAPI, HTTPException
+import hashlib
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+import anyio.to_thread
 import asyncio
 from core.config import settings
+from core.http import close_ollama_client
 from api import auth, chat, models, files, preferences
 
-app = FastAPI(title=settings.APP_NAME, version=settings.VERSION)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nearly every endpoint hops through asyncio.to_thread for sqlite or
+    # disk work; that uses the loop's default executor, capped at
+    # min(32, cpus + 4), well below what those short blocking calls
+    # warrant. The anyio limiter covers the separate pool Starlette uses
+    # for UploadFile I/O and sync dependencies.
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=100, thread_name_prefix="kodah-db")
+    )
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 100
+    # index.html is immutable per deploy, so load it once and serve the
+    # cached bytes — no open/stat syscalls per navigation.
+    with open("static/index.html", "rb") as f:
+        app.state.index_html = f.read()
+    app.state.index_etag = hashlib.md5(app.state.index_html).hexdigest()
+    await chat.db.start_title_worker()
+    await chat.db.start_message_worker()
+    yield
+    await chat.db.stop_message_worker()
+    await chat.db.stop_title_worker()
+    await close_ollama_client()
+
+app = FastAPI(
+    title=settings.APP_NAME,
+    version=settings.VERSION,
+    lifespan=lifespan,
+    # orjson serializes the JSON-heavy endpoints (chat lists, message
+    # histories, model listings) several times faster than stdlib json.
+    default_response_class=ORJSONResponse,
+)
+
+# Compress JSON-heavy responses (chat lists, message histories, model
+# listings, exports) above 1KB. SSE responses stay unbuffered because
+# starlette >= 0.39 (pinned in requirements.txt) exempts
+# text/event-stream from this middleware; earlier versions would hold
+# tokens in the zlib buffer and wreck time-to-first-token.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -21,10 +65,20 @@ app.include_router(models.router, prefix="/api")
 
 @app.get("/{chat_id:int}", response_class=HTMLResponse)
 @app.get("/", response_class=HTMLResponse)
-async def read_root(chat_id: Optional[int] = None):
-    """Serve the main HTML page for any URL path."""
-    with open("static/index.html") as f:
-        return f.read()
+async def read_root(request: Request, chat_id: Optional[int] = None):
+    """Serve the main HTML page for any URL path.
+
+    The payload is cached in memory at startup; matching If-None-Match
+    requests get a body-less 304.
+    """
+    etag = app.state.index_etag
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304)
+    return Response(
+        content=app.state.index_html,
+        media_type="text/html",
+        headers={"ETag": etag, "Cache-Control": "public, max-age=300"},
+    )
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
@@ -33,9 +87,22 @@ async def http_exception_handler(request, exc):
         "status_code": exc.status_code
     }
 
-async def start_model_polling():
-    asyncio.create_task(models.poll_models())
-
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    # uvloop and httptools replace the default event loop and HTTP parser
+    # with C implementations — roughly free throughput for an I/O-bound
+    # service like this one. Workers default to 1: the per-chat hnswlib
+    # index and JSONL memory files are written with no cross-process
+    # coordination, so multiple workers can clobber each other's context
+    # state; raising WEB_CONCURRENCY is only safe once that state moves
+    # to a shared store, and each extra worker also needs
+    # KODAH_TORCH_THREADS lowered to keep torch from oversubscribing
+    # every core per process.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8080,
+        workers=int(os.environ.get("WEB_CONCURRENCY", "1")),
+        loop="uvloop",
+        http="httptools",
+    )
\ No newline at end of file